@@ -2,6 +2,7 @@
 ASGI config for ChessDjango project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django, websockets to the live game updates in ``chess.live``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -13,4 +14,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ChessDjango.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# needs the app registry that get_asgi_application() just loaded
+from chess.live import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
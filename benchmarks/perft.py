@@ -0,0 +1,190 @@
+"""Perft correctness and speed check for both move generators.
+
+    python benchmarks/perft.py                 # run and compare with the baseline
+    python benchmarks/perft.py --save          # run and update the baseline
+    python benchmarks/perft.py -g chessgame -d 4  # the full 1-4 ChessGame check
+
+Exits non-zero when a node count is wrong, when ChessGame.valid_move rejects
+a move ChessGame generated, or when nodes per second drop more than
+--tolerance below the saved baseline.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chess.ChessLogic.ChessBase import ChessGame  # noqa: E402
+from chess.ChessLogic.bitboard import BitBoard, perft  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perft_baseline.json")
+
+# reference counts from https://www.chessprogramming.org/Perft_Results
+POSITIONS = {
+    "startpos": (
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+        [20, 400, 8902, 197281],
+    ),
+    "kiwipete": (
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        [48, 2039, 97862, 4085603],
+    ),
+    "pos3": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238]),
+    "pos4": (
+        "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        [6, 264, 9467, 422333],
+    ),
+    "pos5": (
+        "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+        [44, 1486, 62379, 2103487],
+    ),
+    "pos6": (
+        "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+        [46, 2079, 89890, 3894594],
+    ),
+}
+
+# ChessGame cannot castle, so only positions where castling never comes up
+# within four plies are valid for it.
+CHESSGAME_POSITIONS = ("startpos", "pos3", "pos6")
+# depth 4 of ChessGame is about four million nodes (pos6) plus the
+# valid_move cross-check, minutes rather than seconds; run it with -d 4
+CHESSGAME_DEPTH = 3
+
+
+def chessgame_perft(game, depth, rejected=None):
+    if depth == 0:
+        return 1
+    nodes = 0
+    for op, np in list(game.legal_moves()):
+        # the generator and the move validator the view uses must agree
+        if rejected is not None and not game.valid_move(op, np):
+            rejected.append((game.board_to_fen(), game.translate(op) + game.translate(np)))
+        promotions = "qrbn" if game.g(op).lower() == "p" and np[0] in (0, 7) else "q"
+        for promote in promotions:
+            game.internal_move(op, np, check_inf=False, promote=promote, analyze=False)
+            nodes += chessgame_perft(game, depth - 1, rejected)
+            game.undo_move()
+    return nodes
+
+
+def run_bitboard(fen, depth):
+    return perft(BitBoard(fen), depth)
+
+
+def chessgame_from_fen(fen):
+    placement, color = fen.split()[:2]
+    return ChessGame(
+        start_string=placement, moves=[], to_move="white" if color == "w" else "black"
+    )
+
+
+def run_chessgame(fen, depth):
+    return chessgame_perft(chessgame_from_fen(fen), depth)
+
+
+def check_chessgame(fen, depth):
+    """Node count and every generated move valid_move() rejects, untimed."""
+    rejected = []
+    return chessgame_perft(chessgame_from_fen(fen), depth, rejected), rejected
+
+
+# name -> (timed perft, optional untimed cross-check, positions, default depth)
+GENERATORS = {
+    "bitboard": (run_bitboard, None, tuple(POSITIONS), 4),
+    "chessgame": (run_chessgame, check_chessgame, CHESSGAME_POSITIONS, CHESSGAME_DEPTH),
+}
+
+
+def run(generators, depth=None):
+    results = {}
+    ok = True
+    for name in generators:
+        func, check, positions, default_depth = GENERATORS[name]
+        results[name] = {}
+        for position in positions:
+            fen, expected = POSITIONS[position]
+            results[name][position] = {}
+            for d in range(1, (depth or default_depth) + 1):
+                started = time.perf_counter()
+                nodes = func(fen, d)
+                elapsed = time.perf_counter() - started
+                nps = nodes / elapsed if elapsed else 0.0
+                rejected = []
+                if check is not None and d == (depth or default_depth):
+                    # the deepest run walks every shallower move as well
+                    checked, rejected = check(fen, d)
+                    if checked != nodes:
+                        rejected.append((fen, f"cross-check counted {checked} nodes"))
+                correct = nodes == expected[d - 1] and not rejected
+                ok = ok and correct
+                results[name][position][str(d)] = {"nodes": nodes, "nps": round(nps)}
+                print(
+                    f"{name:10} {position:9} depth {d}: {nodes:>9} nodes "
+                    f"{'OK  ' if correct else 'FAIL'} {elapsed:8.3f}s {nps:>10.0f} nps"
+                )
+                for fen_at, move in rejected[:5]:
+                    print(f"    valid_move rejects {move} in {fen_at}")
+    return results, ok
+
+
+def compare(results, baseline, tolerance):
+    slower = []
+    for name, positions in results.items():
+        for position, depths in positions.items():
+            for d, result in depths.items():
+                old = baseline.get(name, {}).get(position, {}).get(d)
+                # short runs are too noisy to compare
+                if old is None or result["nodes"] < 10000:
+                    continue
+                if result["nps"] < old["nps"] * (1 - tolerance):
+                    slower.append(f"{name} {position} depth {d}: {result['nps']} nps, baseline {old['nps']}")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "-g", "--generator", choices=["all", *GENERATORS], default="all"
+    )
+    parser.add_argument("-d", "--depth", type=int, default=None)
+    parser.add_argument("--save", action="store_true", help="write the baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    generators = list(GENERATORS) if args.generator == "all" else [args.generator]
+    results, ok = run(generators, args.depth)
+    if not ok:
+        print("Perft node counts do not match the reference, or valid_move disagrees")
+        return 1
+
+    if args.save:
+        # merge, so saving one generator or depth keeps the other entries
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        for name, positions in results.items():
+            for position, depths in positions.items():
+                baseline.setdefault(name, {}).setdefault(position, {}).update(depths)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        for line in slower:
+            print("SLOWER " + line)
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
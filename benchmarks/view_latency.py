@@ -0,0 +1,251 @@
+"""Request latency of the chess views, measured with the Django test client.
+
+    python benchmarks/view_latency.py                       # writes view_latency-<commit>.json
+    python benchmarks/view_latency.py --compare old.json
+
+Runs against an in-memory SQLite database. The OpenAI quote, the news
+scrapers, the background blunder analysis and the background game report
+are replaced by local stubs, so only the request path itself is timed.
+The first GET and POST of every game are also reported on their own
+(``*_cold``): they run with empty game, report, eval and TT caches, which
+the warmup would otherwise hide.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+# analyse in this process so timings do not depend on pool start-up
+os.environ.setdefault("CHESS_ENGINE_WORKERS", "0")
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+from ChessDjango import settings as project_settings  # noqa: E402
+
+settings.configure(
+    **{
+        name: getattr(project_settings, name)
+        for name in dir(project_settings)
+        if name.isupper()
+    },
+)
+settings.DATABASES = {
+    "default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}
+}
+settings.ALLOWED_HOSTS = ["*"]
+settings.DEBUG = False
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from chess import analysis, quotes, views  # noqa: E402
+from chess.ChessLogic.ChessBase import ChessGame  # noqa: E402
+from chess.ChessLogic.eval_cache import EVAL_CACHE  # noqa: E402
+from chess.ChessLogic.game_report import REPORT_CACHE  # noqa: E402
+from chess.ChessLogic.transposition import TRANSPOSITION_TABLE  # noqa: E402
+from chess.game_cache import GAME_CACHE  # noqa: E402
+from chess.models import Game  # noqa: E402
+
+GAME_LENGTHS = (10, 60, 150)
+
+
+class NoopExecutor:
+    def submit(self, *args, **kwargs):
+        return None
+
+
+def install_stubs():
+    quotes.QUOTE_POOL.fetch = lambda: "Stub quote. – Benchmark"
+    views.get_all_news = lambda: {
+        "chesscom_news": [],
+        "fide_news": [],
+        "lichess_news": [],
+        "all_news": [],
+    }
+    analysis._executor = NoopExecutor()
+    analysis._report_executor = NoopExecutor()
+
+
+def random_game(plies, seed):
+    """A game of exactly ``plies`` random legal moves, as ChessGame history."""
+    rng = random.Random(seed)
+    while True:
+        game = ChessGame(moves=[])
+        for _ in range(plies):
+            moves = list(game.legal_moves())
+            if not moves:
+                break
+            op, np = rng.choice(moves)
+            game.internal_move(op, np, analyze=False)
+        if len(game.moves) == plies:
+            return game
+
+
+def create_game(game):
+    return Game.objects.create(
+        board=game.str_board(), moves=",,".join(game.moves), to_move=game.to_move
+    )
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(func, count, warmup):
+    for _ in range(warmup):
+        func()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(count):
+        t = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - t) * 1000)
+    total = time.perf_counter() - started
+    return {
+        "requests": count,
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "mean_ms": round(sum(samples) / len(samples), 3),
+        "throughput_rps": round(count / total, 1) if total else 0.0,
+    }
+
+
+def expect(response, status=200):
+    if response.status_code != status:
+        raise RuntimeError(f"{response.status_code} from {response.request['PATH_INFO']}")
+    return response
+
+
+def clear_caches(game_id):
+    EVAL_CACHE.clear()
+    TRANSPOSITION_TABLE.clear()
+    GAME_CACHE.discard(game_id)
+    REPORT_CACHE.discard(game_id)
+
+
+def run(count, warmup, lengths, seed):
+    client = Client()
+    results = {}
+
+    for i in range(20):
+        create_game(random_game(10, seed + i))
+    results["chess_home"] = measure(lambda: expect(client.get("/")), count, warmup)
+
+    for plies in lengths:
+        # the game is generated past ``plies`` so every POST has a legal
+        # move to send: requests replay the continuation one ply at a time
+        full = random_game(plies + count + warmup + 1, seed + plies)
+        start = ChessGame(moves=[])
+        for str_move in full.moves[:plies]:
+            move = start.move_unpack(str_move)
+            start.move(move["op"], move["np"], analyze=False)
+        game = create_game(start)
+        url = f"/game/{game.pk}"
+
+        def get():
+            expect(client.get(url))
+
+        clear_caches(game.pk)
+        results[f"chess_game_get_{plies}_cold"] = measure(get, 1, 0)
+        results[f"chess_game_get_{plies}"] = measure(get, count, warmup)
+
+        continuation = iter(full.moves[plies:])
+
+        def post_next():
+            move = start.move_unpack(next(continuation))
+            response = expect(
+                client.post(
+                    url,
+                    json.dumps({"op": list(move["op"]), "np": list(move["np"])}),
+                    content_type="application/json",
+                )
+            )
+            if response.json()["result"] != "valid move":
+                raise RuntimeError(f"move {move} was rejected")
+
+        clear_caches(game.pk)
+        results[f"chess_game_post_{plies}_cold"] = measure(post_next, 1, 0)
+        results[f"chess_game_post_{plies}"] = measure(post_next, count, warmup)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, old):
+    for name, result in results.items():
+        before = old.get("results", {}).get(name)
+        if before is None:
+            continue
+        change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0.0
+        print(f"{name:26} p50 {before['p50_ms']:>9.3f} -> {result['p50_ms']:>9.3f} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--requests", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--lengths", type=int, nargs="+", default=list(GAME_LENGTHS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", default=None)
+    parser.add_argument("--compare", default=None, help="earlier result file")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        call_command("migrate", verbosity=0)
+        install_stubs()
+        # the views print engine chatter, keep it out of the report
+        results = run(args.requests, args.warmup, args.lengths, args.seed)
+
+    commit = git_commit()
+    for name, result in results.items():
+        if name.endswith("_cold"):
+            print(f"{name:26} first request {result['p50_ms']:>9.3f} ms")
+            continue
+        print(
+            f"{name:26} p50 {result['p50_ms']:>9.3f} ms  p95 {result['p95_ms']:>9.3f} ms  "
+            f"p99 {result['p99_ms']:>9.3f} ms  {result['throughput_rps']:>8.1f} req/s"
+        )
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), f"view_latency-{commit}.json"
+    )
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "python": sys.version.split()[0],
+                "requests": args.requests,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,16 @@
+import re
+
+from .bitboard import (
+    BitBoard,
+    KING,
+    PAWN,
+    PIECE_SYMBOLS,
+    PROMOTION_CHARS,
+    SQUARE_NAMES,
+    STARTING_FEN,
+    make_move,
+)
+
 l = [-7, -6, -5, -4, -3, -2, -1, 1, 2, 3, 4, 5, 6, 7, 8]
 KING_MOVES = [(1, 0), (0, 1), (1, 1), (-1, 0), (0, -1), (-1, -1), (1, -1), (-1, 1)]
 KNIGHT_MOVES = [(-1, -2), (1, -2), (-1, 2), (1, 2), (-2, -1), (2, -1), (-2, 1), (2, 1)]
@@ -6,6 +19,13 @@ for i in l:
     BISHOP_MOVES += [(i, i), (-i, i), (i, -i), (-i, -i)]
 ROOK_MOVES = [(0, x) for x in l] + [(x, 0) for x in l]
 QUEEN_MOVES = BISHOP_MOVES + ROOK_MOVES
+# FEN castling flag, then the king's and the rook's home square and piece
+CASTLING_RIGHTS = (
+    ("K", "e1", (0, 4), "K", "h1", (0, 7), "R"),
+    ("Q", "e1", (0, 4), "K", "a1", (0, 0), "R"),
+    ("k", "e8", (7, 4), "k", "h8", (7, 7), "r"),
+    ("q", "e8", (7, 4), "k", "a8", (7, 0), "r"),
+)
 MOVE_DICT = {
     "k": KING_MOVES,
     "q": QUEEN_MOVES,
@@ -23,6 +43,14 @@ def visp(pos, moves):
     return board
 
 
+def fnv1a_32(text):
+    # mirrored by board_hash() in chess_game.js, keep the two in step
+    h = 0x811C9DC5
+    for byte in text.encode():
+        h = ((h ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return h
+
+
 def pair_add(p1, p2):
     return (p1[0] + p2[0], p1[1] + p2[1])
 
@@ -64,15 +92,109 @@ def vm_list(piece, pos):
         return []
 
 
+def _on_board(p):
+    return 0 <= p[0] <= 7 and 0 <= p[1] <= 7
+
+
+def _step_table(steps):
+    return {
+        sq: tuple(p for p in (pair_add(sq, x) for x in steps) if _on_board(p))
+        for sq in SQUARE_LIST
+    }
+
+
+def _ray_table(directions):
+    table = {}
+    for sq in SQUARE_LIST:
+        rays = []
+        for d in directions:
+            ray = []
+            p = pair_add(sq, d)
+            while _on_board(p):
+                ray.append(p)
+                p = pair_add(p, d)
+            if ray:
+                rays.append(tuple(ray))
+        table[sq] = tuple(rays)
+    return table
+
+
+SQUARE_LIST = [(r, c) for r in range(0, 8) for c in range(0, 8)]
+KING_TABLE = _step_table(KING_MOVES)
+KNIGHT_TABLE = _step_table(KNIGHT_MOVES)
+# squares attacked by a pawn of the given color standing on the key square
+PAWN_ATTACK_TABLE = {
+    "white": _step_table([(1, -1), (1, 1)]),
+    "black": _step_table([(-1, -1), (-1, 1)]),
+}
+ROOK_RAYS = _ray_table([(1, 0), (-1, 0), (0, 1), (0, -1)])
+BISHOP_RAYS = _ray_table([(1, 1), (1, -1), (-1, 1), (-1, -1)])
+QUEEN_RAYS = {sq: ROOK_RAYS[sq] + BISHOP_RAYS[sq] for sq in SQUARE_LIST}
+
+
+PGN_HEADER = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+PGN_TOKEN = re.compile(
+    r"\{|\}|\(|\)|;|\$\d+|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s{}();.]+"
+)
+PGN_RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+PGN_TAGS = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+PROMOTION_PIECES = {char: piece for piece, char in PROMOTION_CHARS.items()}
+
+
 def read_pgn(str_pgn):
-    pass
+    """Yield {"headers", "moves", "result"} for every game in a PGN source.
+
+    ``str_pgn`` is either the PGN text or any iterable of lines (an open
+    file), which is read lazily so only the current game is held in memory.
+    Comments, variations and NAGs are skipped; moves are left in SAN.
+    """
+    lines = str_pgn.splitlines() if isinstance(str_pgn, str) else str_pgn
+    headers, moves = {}, []
+    comment = variation = 0
+    for line in lines:
+        line = line.strip()
+        if not comment and not variation:
+            header = PGN_HEADER.match(line)
+            if header:
+                if moves:
+                    # a new game started without a result token
+                    yield {"headers": headers, "moves": moves, "result": "*"}
+                    headers, moves = {}, []
+                headers[header.group(1)] = header.group(2)
+                continue
+            if line.startswith("%"):
+                continue
+        for token in PGN_TOKEN.findall(line):
+            if comment:
+                comment = token != "}"
+            elif token == "{":
+                comment = 1
+            elif token == ";":
+                break
+            elif token == "(":
+                variation += 1
+            elif token == ")":
+                variation = max(0, variation - 1)
+            elif variation or token.startswith("$") or token[0].isdigit() and token.endswith("."):
+                continue
+            elif token in PGN_RESULTS:
+                yield {"headers": headers, "moves": moves, "result": token}
+                headers, moves = {}, []
+            else:
+                moves.append(token)
+    if moves or headers:
+        yield {"headers": headers, "moves": moves, "result": headers.get("Result", "*")}
 
 
 from .blunder_detection import ChessBlunderDetector
+from .game_report import GameReport, REPORT_CACHE
+from .timing import NULL_TIMER
 
 
 class ChessGame(object):
     default_board = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR"
+    # every n-th history entry also stores the board it was played on
+    checkpoint_interval = 16
 
     def __init__(self, start_string=None, moves=[], to_move="white"):
         self.board = self.board_from_string(start_string)
@@ -80,15 +202,170 @@ class ChessGame(object):
         self.to_move = to_move
         self.blunder_detector = ChessBlunderDetector()
         self.last_blunder_message = None
+        # (fen_before, fen_after) of the last move, for deferred analysis
+        self.last_positions = None
+        # set to a RequestTimer to time the phases of a move
+        self.timer = NULL_TIMER
+        # legal_move_map() of the current position, dropped on every move
+        self._legal_map = None
+
+    @classmethod
+    def from_san(cls, san_moves, fen=None):
+        """Replay SAN moves and return the resulting game.
+
+        Moves are resolved on a BitBoard, which also handles castling; the
+        history entries are written in the same format as ``internal_move``.
+        Raises ValueError on the first illegal move.
+        """
+        board = BitBoard(fen or STARTING_FEN)
+        moves = []
+        for san in san_moves:
+            move = board.parse_san(san)
+            frm, to, promotion = move & 63, (move >> 6) & 63, move >> 12
+            mailbox = board.mailbox
+            info = []
+            if len(moves) % cls.checkpoint_interval == 0:
+                info += ["board-" + board.fen.split()[0]]
+            piece_type = mailbox[frm] & 7
+            if mailbox[to]:
+                info += ["capture-" + PIECE_SYMBOLS[mailbox[to]]]
+            elif piece_type == PAWN and to == board.ep_square:
+                ep = to - 8 if board.turn else to + 8
+                info += ["enpass-" + SQUARE_NAMES[ep]]
+            if promotion:
+                info += ["promote-" + PROMOTION_CHARS[promotion]]
+            elif piece_type == KING and abs(to - frm) == 2:
+                rook = (frm + 3, frm + 1) if to > frm else (frm - 4, frm - 1)
+                info += ["castle-" + SQUARE_NAMES[rook[0]] + SQUARE_NAMES[rook[1]]]
+            board.push(move)
+            if board.is_check():
+                info += ["check" if board.legal_moves else "checkmate"]
+            moves.append(
+                ";;".join([SQUARE_NAMES[frm], SQUARE_NAMES[to], *info])
+            )
+        return cls(
+            start_string=board.fen.split()[0],
+            moves=moves,
+            to_move="white" if board.turn else "black",
+        )
 
     def move_unpack(self, str_move):
         a = str_move.split(";;")
-        return {
-            "board": a[0],
-            "op": self.translate(a[1]),
-            "np": self.translate(a[2]),
-            "info": a[3:],
+        move = {
+            "op": self.translate(a[0]),
+            "np": self.translate(a[1]),
+            "info": [],
+            "captured": "-",
+            "board": None,
         }
+        for x in a[2:]:
+            if x.startswith("board-"):
+                move["board"] = x[6:]
+            elif x.startswith("capture-"):
+                move["captured"] = x[8:]
+            else:
+                move["info"].append(x)
+        return move
+
+    def apply_delta(self, board, move):
+        op, np = move["op"], move["np"]
+        piece = board[op[0]][op[1]]
+        for x in move["info"]:
+            if x.startswith("promote-"):
+                piece = x[8:].upper() if piece == "P" else x[8:].lower()
+            elif x.startswith("enpass-"):
+                ep = self.translate(x[7:])
+                board[ep[0]][ep[1]] = "-"
+            elif x.startswith("castle-"):
+                rook_op, rook_np = self.translate(x[7:9]), self.translate(x[9:11])
+                board[rook_np[0]][rook_np[1]] = board[rook_op[0]][rook_op[1]]
+                board[rook_op[0]][rook_op[1]] = "-"
+        board[np[0]][np[1]] = piece
+        board[op[0]][op[1]] = "-"
+
+    def last_move_delta(self):
+        """[row, col, piece] for every square the last history entry changed."""
+        move = self.move_unpack(self.moves[-1])
+        squares = [move["op"], move["np"]]
+        for x in move["info"]:
+            if x.startswith("enpass-"):
+                squares.append(self.translate(x[7:]))
+            elif x.startswith("castle-"):
+                squares += [self.translate(x[7:9]), self.translate(x[9:11])]
+        return [[r, c, self.board[r][c]] for r, c in squares]
+
+    def board_at(self, ply):
+        """Board before history entry ``ply``, rebuilt from the nearest checkpoint."""
+        if ply >= len(self.moves):
+            return [row[:] for row in self.board]
+        start = ply
+        while start > 0 and ";;board-" not in self.moves[start]:
+            start -= 1
+        board = self.board_from_string(self.move_unpack(self.moves[start])["board"])
+        for i in range(start, ply):
+            self.apply_delta(board, self.move_unpack(self.moves[i]))
+        return board
+
+    def iter_positions(self, start=0):
+        """Yield (fen, color to move, history entry) for every position from ``start`` on.
+
+        The last position is the current one and comes with entry None.
+        """
+        board = self.board_at(start)
+        to_move = self.to_move
+        if (len(self.moves) - start) % 2:
+            to_move = "white" if to_move == "black" else "black"
+        for ply, str_move in enumerate(self.moves[start:], start):
+            move = self.move_unpack(str_move)
+            yield self.board_to_fen(board, to_move, self.moves[:ply]), to_move, move
+            self.apply_delta(board, move)
+            to_move = "white" if to_move == "black" else "black"
+        yield self.board_to_fen(board, to_move), to_move, None
+
+    def export_pgn(self, headers=None, fens=False):
+        """PGN text of the game, with ``fens`` every move gets a FEN comment."""
+        start_fen, color, _ = next(self.iter_positions())
+        board = BitBoard(start_fen)
+        tags = {key: "?" for key in PGN_TAGS}
+        tags.update(headers or {})
+        if start_fen != STARTING_FEN:
+            tags["SetUp"] = "1"
+            tags["FEN"] = start_fen
+
+        tokens = []
+        if color == "black" and self.moves:
+            tokens.append(f"{board.fullmove_number}...")
+        result = tags["Result"]
+        for str_move in self.moves:
+            move = self.move_unpack(str_move)
+            promotion = 0
+            for x in move["info"]:
+                if x.startswith("promote-"):
+                    promotion = PROMOTION_PIECES[x[8:]]
+                elif x == "checkmate":
+                    result = "1-0" if board.turn else "0-1"
+            (or_, oc), (nr, nc) = move["op"], move["np"]
+            bb_move = make_move(or_ * 8 + oc, nr * 8 + nc, promotion)
+            if board.turn:
+                tokens.append(f"{board.fullmove_number}.")
+            tokens.append(board.san(bb_move))
+            board.push(bb_move)
+            if fens:
+                tokens.append("{" + board.fen + "}")
+        tags["Result"] = result if result != "?" else "*"
+        tokens.append(tags["Result"])
+
+        lines = [f'[{key} "{value}"]' for key, value in tags.items()]
+        lines.append("")
+        line = ""
+        for token in tokens:
+            if line and len(line) + len(token) >= 80:
+                lines.append(line)
+                line = token
+            else:
+                line = f"{line} {token}" if line else token
+        lines.append(line)
+        return "\n".join(lines) + "\n\n"
 
     def en_passant(self, op, np):
         if self.g(op).lower() != "p" or len(self.moves) <= 0:
@@ -96,7 +373,11 @@ class ChessGame(object):
         last = self.move_unpack(self.moves[-1])
         check = "p" if self.g(op) == "P" else "P"
         if self.g(last["np"]) == check and abs(last["op"][0] - last["np"][0]) == 2:
-            if midpoint(last["op"], last["np"]) == np:
+            if (
+                midpoint(last["op"], last["np"]) == np
+                and op[0] == last["np"][0]
+                and abs(op[1] - last["np"][1]) == 1
+            ):
                 return last["np"]
         return False
 
@@ -133,10 +414,15 @@ class ChessGame(object):
         self.board = self.board_from_string()
         self.moves = []
         self.to_move = "white"
+        self._legal_map = None
 
     def str_board(self):
         return "\n".join(["".join([str(x) for x in y]) for y in self.board][::-1])
 
+    def board_hash(self):
+        """FNV-1a of ``str_board()``, lets a client check a board it patched."""
+        return fnv1a_32(self.str_board())
+
     def __str__(self):
         return "\n".join(["".join([str(x) for x in y]) for y in self.board][::-1])
 
@@ -145,8 +431,21 @@ class ChessGame(object):
             return False
         else:
             last_move = self.move_unpack(self.moves.pop())
-            self.board = self.board_from_string(last_move["board"])
+            op, np = last_move["op"], last_move["np"]
+            piece = self.g(np)
+            for x in last_move["info"]:
+                if x.startswith("promote-"):
+                    piece = "P" if piece.isupper() else "p"
+                elif x.startswith("enpass-"):
+                    self.s(self.translate(x[7:]), "p" if piece.isupper() else "P")
+                elif x.startswith("castle-"):
+                    rook_op, rook_np = self.translate(x[7:9]), self.translate(x[9:11])
+                    self.s(rook_op, self.g(rook_np))
+                    self.s(rook_np, "-")
+            self.s(op, piece)
+            self.s(np, last_move["captured"])
             self.toggle_move()
+            self._legal_map = None
             return last_move
 
     def king_position(self, color):
@@ -156,30 +455,48 @@ class ChessGame(object):
                     return (i, j)
         return False
 
-    def board_to_fen(self):
+    def castling_field(self, board, moves):
+        """FEN castling rights: king and rook at home, neither moved nor captured in ``moves``."""
+        field = ""
+        touched = None
+        for char, king, (kr, kc), king_piece, rook, (rr, rc), rook_piece in CASTLING_RIGHTS:
+            if board[kr][kc] != king_piece or board[rr][rc] != rook_piece:
+                continue
+            if touched is None:
+                # history entries start "<from>;;<to>"
+                touched = {sq for str_move in moves for sq in (str_move[:2], str_move[4:6])}
+            if king not in touched and rook not in touched:
+                field += char
+        return field or "-"
+
+    def ep_field(self, board, moves):
+        """FEN en passant square, set like BitBoard does: only when a pawn can take."""
+        if not moves:
+            return "-"
+        last = moves[-1]
+        if abs(int(last[5]) - int(last[1])) != 2:
+            return "-"
+        (or_, oc), (nr, nc) = self.translate(last[:2]), self.translate(last[4:6])
+        pawn = board[nr][nc]
+        if pawn not in ("P", "p"):
+            return "-"
+        enemy = "p" if pawn == "P" else "P"
+        if any(0 <= c < 8 and board[nr][c] == enemy for c in (nc - 1, nc + 1)):
+            return self.translate(((or_ + nr) // 2, nc))
+        return "-"
+
+    def board_to_fen(self, board=None, to_move=None, moves=None):
+        """FEN of ``board``, with castling and en passant taken from ``moves``, the history leading to it."""
+        board = self.board if board is None else board
+        to_move = self.to_move if to_move is None else to_move
+        moves = self.moves if moves is None else moves
         try:
-            fen = []
-            empty = 0
-
-            for row in range(7, -1, -1):
-                for col in range(8):
-                    piece = self.board[row][col]
-                    if piece == "-":
-                        empty += 1
-                    else:
-                        if empty > 0:
-                            fen.append(str(empty))
-                            empty = 0
-                        fen.append(piece)
-
-                if empty > 0:
-                    fen.append(str(empty))
-                    empty = 0
-                if row > 0:
-                    fen.append("/")
-
-            fen = "".join(fen)
-            fen += f" {'w' if self.to_move == 'white' else 'b'} KQkq - 0 1"
+            # the reverse of board_from_string, longest runs of empty squares first
+            fen = "/".join(["".join(row) for row in board][::-1])
+            for i in "87654321":
+                fen = fen.replace("-" * int(i), i)
+            fen += f" {'w' if to_move == 'white' else 'b'}"
+            fen += f" {self.castling_field(board, moves)} {self.ep_field(board, moves)} 0 1"
 
             return fen
         except Exception as e:
@@ -187,11 +504,14 @@ class ChessGame(object):
 
             return "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 
-    def internal_move(self, op, np, check_inf=True, promote="q"):
+    def internal_move(self, op, np, check_inf=True, promote="q", analyze=True):
         if promote.lower() not in ("q", "n", "r", "b"):
             return False
         info = []
-        old_board = self.str_board()
+        if len(self.moves) % self.checkpoint_interval == 0:
+            info += ["board-" + self.board_to_fen().split()[0]]
+        if self.g(np) != "-":
+            info += ["capture-" + self.g(np)]
 
         fen_before = self.board_to_fen()
 
@@ -204,37 +524,62 @@ class ChessGame(object):
         self.s(np, self.g(op))
         self.s(op, "-")
         self.toggle_move()
-
-        fen_after = self.board_to_fen()
-
-        print("\nChecking for blunders...")
-        try:
-            is_blunder, blunder_message = self.blunder_detector.detect_blunder(
-                fen_before, fen_after
-            )
-            self.last_blunder_message = blunder_message
-            if is_blunder:
-                print(f"Blunder detected: {blunder_message}")
-                info.append("blunder")
-        except Exception as e:
-            self.last_blunder_message = "Move analyzed..."
+        self._legal_map = None
+        # the history entry is appended below, the FEN needs it already
+        played = self.translate(op) + ";;" + self.translate(np)
+        fen_after = self.board_to_fen(moves=self.moves + [played])
+        self.last_positions = (fen_before, fen_after)
+
+        if analyze:
+            with self.timer.span("blunder"):
+                try:
+                    is_blunder, blunder_message = self.blunder_detector.detect_blunder(
+                        fen_before, fen_after
+                    )
+                    self.last_blunder_message = blunder_message
+                    if is_blunder:
+                        info.append("blunder")
+                except Exception as e:
+                    self.last_blunder_message = "Move analyzed..."
 
         if check_inf:
-            if self.is_mate():
-                info += ["checkmate"]
-            elif self.is_check():
-                info += ["check"]
+            with self.timer.span("check"):
+                if self.is_mate():
+                    info += ["checkmate"]
+                elif self.is_check():
+                    info += ["check"]
 
-        self.moves.append(
-            ";;".join([old_board, self.translate(op), self.translate(np), *info])
-        )
+        self.moves.append(";;".join([self.translate(op), self.translate(np), *info]))
         return True
 
+    def probe_move(self, op, np, promote="q"):
+        # Board-only make for legality probes: no history, no FEN, no analysis.
+        moved = self.g(op)
+        captured = self.g(np)
+        enpass = self.en_passant(op, np)
+        enpass_piece = None
+        if enpass:
+            enpass_piece = self.g(enpass)
+            self.s(enpass, "-")
+        piece = moved
+        if moved.lower() == "p" and (np[0] == 7 or np[0] == 0):
+            piece = promote.upper() if moved == "P" else promote.lower()
+        self.s(np, piece)
+        self.s(op, "-")
+        return (op, np, moved, captured, enpass, enpass_piece)
+
+    def undo_probe(self, probe):
+        op, np, moved, captured, enpass, enpass_piece = probe
+        self.s(op, moved)
+        self.s(np, captured)
+        if enpass:
+            self.s(enpass, enpass_piece)
+
     def puts_check(self, op, np):
-        c = "white" if self.g(op) == self.g(op).upper() else "black"
-        self.internal_move(op, np, check_inf=False)
-        is_check = self.is_check(self.oppo())
-        self.undo_move()
+        c = self.gcolor(op)
+        probe = self.probe_move(op, np)
+        is_check = self.is_check(c)
+        self.undo_probe(probe)
         return is_check
 
     def gcolor(self, op):
@@ -252,13 +597,31 @@ class ChessGame(object):
         kpos = self.king_position(color)
         if not kpos:
             return True
+        return self.attacked(kpos, "white" if color == "black" else "black")
+
+    def attacked(self, pos, color):
+        board = self.board
+        if color == "white":
+            pawn, knight, king, rook, bishop, queen = "PNKRBQ"
         else:
-            for i in range(0, 8):
-                for j in range(0, 8):
-                    if self.gcolor((i, j)) not in (color, "empty"):
-                        aj = (i, j)
-                        if self.direct_attack(aj, kpos):
+            pawn, knight, king, rook, bishop, queen = "pnkrbq"
+        for r, c in KNIGHT_TABLE[pos]:
+            if board[r][c] == knight:
+                return True
+        for r, c in KING_TABLE[pos]:
+            if board[r][c] == king:
+                return True
+        for r, c in PAWN_ATTACK_TABLE["black" if color == "white" else "white"][pos]:
+            if board[r][c] == pawn:
+                return True
+        for rays, slider in ((ROOK_RAYS, rook), (BISHOP_RAYS, bishop)):
+            for ray in rays[pos]:
+                for r, c in ray:
+                    p = board[r][c]
+                    if p != "-":
+                        if p == slider or p == queen:
                             return True
+                        break
         return False
 
     def ccolor(self, p, color):
@@ -302,20 +665,23 @@ class ChessGame(object):
                 return (b[1] == 1 and self.g(np) != "-") or (
                     b[1] == 0 and self.g(np) == "-"
                 )
-            elif b[0] == 2:
+            elif b[0] == 2 and b[1] == 0:
                 return (op[0] == 1 and self.g(np) == "-") or (
                     op[0] == 6 and self.g(np) == "-"
                 )
         return False
 
-    def move(self, op, np=None, promote="q"):
+    def move(self, op, np=None, promote="q", analyze=True):
         if np == None:
             return self.move(
-                self.translate(op[0:2]), self.translate(op[2:]), promote=promote
+                self.translate(op[0:2]),
+                self.translate(op[2:]),
+                promote=promote,
+                analyze=analyze,
             )
         else:
             return self.valid_move(op, np) and self.internal_move(
-                op, np, promote=promote
+                op, np, promote=promote, analyze=analyze
             )
 
     def is_mate(self):
@@ -330,17 +696,143 @@ class ChessGame(object):
         return not self.is_check(self.to_move) and not self.any_valid()
 
     def any_valid(self):
-        for ia in range(0, 8):
-            for ja in range(0, 8):
-                if self.gcolor((ia, ja)) == self.to_move:
-                    for kb in range(0, 8):
-                        for lb in range(0, 8):
-                            if self.valid_move((ia, ja), (kb, lb)):
-                                return True
+        for _ in self.legal_moves():
+            return True
         return False
 
+    def legal_move_map(self):
+        """{"<row><col>": [[row, col], ...]} of legal destinations for the side to move.
+
+        Built once per position; the live game cache keeps it between requests.
+        """
+        if self._legal_map is None:
+            legal = {}
+            for op, np in self.legal_moves():
+                legal.setdefault(f"{op[0]}{op[1]}", []).append(list(np))
+            self._legal_map = legal
+        return self._legal_map
+
+    def legal_moves(self):
+        """Yield every legal (op, np) pair for the side to move."""
+        color = self.to_move
+        them = self.oppo()
+        board = self.board
+        kpos = self.king_position(color)
+        if not kpos:
+            return
+        ours = str.isupper if color == "white" else str.islower
+        if color == "white":
+            enemy_pawn, enemy_knight, enemy_rook, enemy_bishop, enemy_queen = "pnrbq"
+        else:
+            enemy_pawn, enemy_knight, enemy_rook, enemy_bishop, enemy_queen = "PNRBQ"
+
+        # Walk the rays out of the king once to find sliding checkers and pins.
+        checkers = []
+        evasions = set()
+        pins = {}
+        for rays, slider in ((ROOK_RAYS, enemy_rook), (BISHOP_RAYS, enemy_bishop)):
+            for ray in rays[kpos]:
+                own = None
+                for i, (r, c) in enumerate(ray):
+                    p = board[r][c]
+                    if p == "-":
+                        continue
+                    if ours(p):
+                        if own is not None:
+                            break
+                        own = (r, c)
+                        continue
+                    if p == slider or p == enemy_queen:
+                        if own is None:
+                            checkers.append((r, c))
+                            evasions.update(ray[: i + 1])
+                        else:
+                            pins[own] = set(ray[: i + 1])
+                    break
+        for r, c in KNIGHT_TABLE[kpos]:
+            if board[r][c] == enemy_knight:
+                checkers.append((r, c))
+                evasions.add((r, c))
+        for r, c in PAWN_ATTACK_TABLE[color][kpos]:
+            if board[r][c] == enemy_pawn:
+                checkers.append((r, c))
+                evasions.add((r, c))
+
+        self.s(kpos, "-")
+        try:
+            king_targets = [
+                np
+                for np in KING_TABLE[kpos]
+                if not ours(self.g(np)) and not self.attacked(np, them)
+            ]
+        finally:
+            self.s(kpos, "K" if color == "white" else "k")
+        for np in king_targets:
+            yield (kpos, np)
+        if len(checkers) > 1:
+            return
+
+        direction = 1 if color == "white" else -1
+        start_row = 1 if color == "white" else 6
+        for op in SQUARE_LIST:
+            p = board[op[0]][op[1]]
+            if p == "-" or not ours(p) or op == kpos:
+                continue
+            allowed = pins.get(op)
+            piece = p.lower()
+            targets = []
+            if piece == "p":
+                one = (op[0] + direction, op[1])
+                if _on_board(one) and board[one[0]][one[1]] == "-":
+                    targets.append(one)
+                    two = (op[0] + 2 * direction, op[1])
+                    if op[0] == start_row and board[two[0]][two[1]] == "-":
+                        targets.append(two)
+                for r, c in PAWN_ATTACK_TABLE[color][op]:
+                    q = board[r][c]
+                    if q != "-" and not ours(q):
+                        targets.append((r, c))
+                    elif q == "-" and self.en_passant(op, (r, c)):
+                        # the captured pawn leaves a different square than
+                        # the one moved to, so just try it
+                        probe = self.probe_move(op, (r, c))
+                        safe = not self.is_check(color)
+                        self.undo_probe(probe)
+                        if safe:
+                            yield (op, (r, c))
+            elif piece == "n":
+                targets = [q for q in KNIGHT_TABLE[op] if not ours(self.g(q))]
+            else:
+                rays = QUEEN_RAYS if piece == "q" else (
+                    ROOK_RAYS if piece == "r" else BISHOP_RAYS
+                )
+                for ray in rays[op]:
+                    for r, c in ray:
+                        q = board[r][c]
+                        if q == "-":
+                            targets.append((r, c))
+                        else:
+                            if not ours(q):
+                                targets.append((r, c))
+                            break
+            for np in targets:
+                if allowed is not None and np not in allowed:
+                    continue
+                if checkers and np not in evasions:
+                    continue
+                yield (op, np)
+
     def get_last_blunder_message(self):
         return self.last_blunder_message
 
-    def analyze_moves(self):
-        return ""
+    def analyze_moves(self, cache_key=None):
+        """Per-ply report of the whole game, see ``GameReport``.
+
+        With a ``cache_key`` (the game id) the report is kept between calls
+        and only plies added since the last call are analysed.
+        """
+        if cache_key is None:
+            report = GameReport(self.blunder_detector)
+        else:
+            report = REPORT_CACHE.get(cache_key, self.blunder_detector)
+        return report.update(self)
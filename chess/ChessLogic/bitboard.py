@@ -0,0 +1,728 @@
+import random
+import re
+from typing import List, Optional
+
+from .psqt import PIECE_SQUARE_TABLES
+
+PAWN = 1
+KNIGHT = 2
+BISHOP = 3
+ROOK = 4
+QUEEN = 5
+KING = 6
+
+WHITE = True
+BLACK = False
+
+SQUARES = list(range(64))
+
+PIECE_VALUES = {PAWN: 100, KNIGHT: 320, BISHOP: 330, ROOK: 500, QUEEN: 900, KING: 20000}
+
+FEN_PIECE_MAP = {
+    "p": (PAWN, BLACK),
+    "n": (KNIGHT, BLACK),
+    "b": (BISHOP, BLACK),
+    "r": (ROOK, BLACK),
+    "q": (QUEEN, BLACK),
+    "k": (KING, BLACK),
+    "P": (PAWN, WHITE),
+    "N": (KNIGHT, WHITE),
+    "B": (BISHOP, WHITE),
+    "R": (ROOK, WHITE),
+    "Q": (QUEEN, WHITE),
+    "K": (KING, WHITE),
+}
+SQUARE_NAMES = [
+    'a1', 'b1', 'c1', 'd1', 'e1', 'f1', 'g1', 'h1',
+    'a2', 'b2', 'c2', 'd2', 'e2', 'f2', 'g2', 'h2',
+    'a3', 'b3', 'c3', 'd3', 'e3', 'f3', 'g3', 'h3',
+    'a4', 'b4', 'c4', 'd4', 'e4', 'f4', 'g4', 'h4',
+    'a5', 'b5', 'c5', 'd5', 'e5', 'f5', 'g5', 'h5',
+    'a6', 'b6', 'c6', 'd6', 'e6', 'f6', 'g6', 'h6',
+    'a7', 'b7', 'c7', 'd7', 'e7', 'f7', 'g7', 'h7',
+    'a8', 'b8', 'c8', 'd8', 'e8', 'f8', 'g8', 'h8',
+]
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+class Piece:
+    def __init__(self, piece_type, color):
+        self.piece_type = piece_type
+        self.color = color
+
+    def __str__(self):
+        piece_chars = {
+            PAWN: "P",
+            KNIGHT: "N",
+            BISHOP: "B",
+            ROOK: "R",
+            QUEEN: "Q",
+            KING: "K",
+        }
+        char = piece_chars.get(self.piece_type, "?")
+        return char.lower() if not self.color else char
+
+
+# Pieces are stored in the mailbox as small ints: piece_type | (color << 3),
+# so white pieces are 9..14 and black pieces 1..6, 0 is an empty square.
+PIECE_SYMBOLS = {t | (c << 3): s for s, (t, c) in FEN_PIECE_MAP.items()}
+PIECE_OBJECTS = {code: Piece(code & 7, bool(code >> 3)) for code in PIECE_SYMBOLS}
+PROMOTION_CHARS = {KNIGHT: "n", BISHOP: "b", ROOK: "r", QUEEN: "q"}
+
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+BB_ALL = (1 << 64) - 1
+BB_RANK_1 = 0xFF
+BB_RANK_8 = 0xFF << 56
+
+
+def _offset_table(deltas):
+    table = []
+    for sq in SQUARES:
+        bb = 0
+        rank, file = sq >> 3, sq & 7
+        for dr, df in deltas:
+            r, f = rank + dr, file + df
+            if 0 <= r < 8 and 0 <= f < 8:
+                bb |= 1 << (r * 8 + f)
+        table.append(bb)
+    return table
+
+
+def _ray_table(dr, df):
+    table = []
+    for sq in SQUARES:
+        bb = 0
+        r, f = (sq >> 3) + dr, (sq & 7) + df
+        while 0 <= r < 8 and 0 <= f < 8:
+            bb |= 1 << (r * 8 + f)
+            r, f = r + dr, f + df
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _offset_table(
+    [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]
+)
+KING_ATTACKS = _offset_table(
+    [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
+)
+# PAWN_ATTACKS[color][sq]: squares attacked by a pawn of that color on sq.
+PAWN_ATTACKS = [_offset_table([(-1, -1), (-1, 1)]), _offset_table([(1, -1), (1, 1)])]
+
+RAY_N = _ray_table(1, 0)
+RAY_S = _ray_table(-1, 0)
+RAY_E = _ray_table(0, 1)
+RAY_W = _ray_table(0, -1)
+RAY_NE = _ray_table(1, 1)
+RAY_NW = _ray_table(1, -1)
+RAY_SE = _ray_table(-1, 1)
+RAY_SW = _ray_table(-1, -1)
+
+# Rays pointing towards higher square indices are cut at their lowest set
+# blocker, the others at their highest.
+ROOK_RAYS_UP = (RAY_N, RAY_E)
+ROOK_RAYS_DOWN = (RAY_S, RAY_W)
+BISHOP_RAYS_UP = (RAY_NE, RAY_NW)
+BISHOP_RAYS_DOWN = (RAY_SE, RAY_SW)
+
+
+def _between_table():
+    table = [[0] * 64 for _ in SQUARES]
+    for ray in (RAY_N, RAY_S, RAY_E, RAY_W, RAY_NE, RAY_NW, RAY_SE, RAY_SW):
+        for a in SQUARES:
+            bb = ray[a]
+            while bb:
+                b = (bb & -bb).bit_length() - 1
+                bb &= bb - 1
+                table[a][b] = ray[a] & ~ray[b] & ~(1 << b)
+    return table
+
+
+BETWEEN = _between_table()
+
+CASTLING_MASK = [0xF] * 64
+CASTLING_MASK[0] = 0xF & ~WHITE_QUEENSIDE
+CASTLING_MASK[7] = 0xF & ~WHITE_KINGSIDE
+CASTLING_MASK[4] = 0xF & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[56] = 0xF & ~BLACK_QUEENSIDE
+CASTLING_MASK[63] = 0xF & ~BLACK_KINGSIDE
+CASTLING_MASK[60] = 0xF & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+
+
+# PSQ[code][sq]: material plus piece-square bonus, signed from white's side.
+PSQ = [[0] * 64 for _ in range(15)]
+for _code in PIECE_SYMBOLS:
+    for _sq in SQUARES:
+        if _code >> 3:
+            _bonus = PIECE_SQUARE_TABLES[_code & 7][_sq ^ 56]
+            PSQ[_code][_sq] = PIECE_VALUES[_code & 7] + _bonus
+        else:
+            _bonus = PIECE_SQUARE_TABLES[_code & 7][_sq]
+            PSQ[_code][_sq] = -(PIECE_VALUES[_code & 7] + _bonus)
+
+# Zobrist keys come from a fixed seed so hashes are stable across processes.
+_zobrist_random = random.Random(0x5A0B)
+ZOBRIST_PIECES = [[_zobrist_random.getrandbits(64) for _ in SQUARES] for _ in range(15)]
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP = [_zobrist_random.getrandbits(64) for _ in range(8)]
+ZOBRIST_BLACK = _zobrist_random.getrandbits(64)
+
+
+def rook_attacks(sq, occupied):
+    attacks = 0
+    for ray in ROOK_RAYS_UP:
+        bb = ray[sq]
+        blockers = bb & occupied
+        if blockers:
+            bb ^= ray[(blockers & -blockers).bit_length() - 1]
+        attacks |= bb
+    for ray in ROOK_RAYS_DOWN:
+        bb = ray[sq]
+        blockers = bb & occupied
+        if blockers:
+            bb ^= ray[blockers.bit_length() - 1]
+        attacks |= bb
+    return attacks
+
+
+def bishop_attacks(sq, occupied):
+    attacks = 0
+    for ray in BISHOP_RAYS_UP:
+        bb = ray[sq]
+        blockers = bb & occupied
+        if blockers:
+            bb ^= ray[(blockers & -blockers).bit_length() - 1]
+        attacks |= bb
+    for ray in BISHOP_RAYS_DOWN:
+        bb = ray[sq]
+        blockers = bb & occupied
+        if blockers:
+            bb ^= ray[blockers.bit_length() - 1]
+        attacks |= bb
+    return attacks
+
+
+def iter_squares(bb):
+    while bb:
+        yield (bb & -bb).bit_length() - 1
+        bb &= bb - 1
+
+
+# A move is a plain int: from | to << 6 | promotion piece type << 12.
+def make_move(from_square, to_square, promotion=0):
+    return from_square | (to_square << 6) | (promotion << 12)
+
+
+def move_from_square(move):
+    return move & 63
+
+
+def move_to_square(move):
+    return (move >> 6) & 63
+
+
+def move_promotion(move):
+    return move >> 12
+
+
+def move_to_uci(move):
+    uci = SQUARE_NAMES[move & 63] + SQUARE_NAMES[(move >> 6) & 63]
+    if move >> 12:
+        uci += PROMOTION_CHARS[move >> 12]
+    return uci
+
+
+def move_from_uci(uci):
+    promotion = 0
+    if len(uci) > 4:
+        promotion = FEN_PIECE_MAP[uci[4].lower()][0]
+    return make_move(
+        SQUARE_NAMES.index(uci[:2]), SQUARE_NAMES.index(uci[2:4]), promotion
+    )
+
+
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+SAN_PIECES = {"N": KNIGHT, "B": BISHOP, "R": ROOK, "Q": QUEEN, "K": KING}
+
+
+class BitBoard:
+    """Position stored as 64-bit integer bitboards plus a square mailbox."""
+
+    def __init__(self, fen=STARTING_FEN):
+        self.mailbox = [0] * 64
+        self.by_type = [0] * 7
+        self.occupied_co = [0, 0]
+        self.turn = WHITE
+        self.castling = 0
+        self.ep_square = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.key = 0
+        self.psq = 0
+        self._stack = []
+        self._parse_fen(fen)
+        self.key ^= ZOBRIST_CASTLING[self.castling]
+        if self.ep_square is not None:
+            self.key ^= ZOBRIST_EP[self.ep_square & 7]
+        if self.turn == BLACK:
+            self.key ^= ZOBRIST_BLACK
+
+    def _parse_fen(self, fen):
+        parts = fen.split()
+        ranks = parts[0].split("/")
+        if len(ranks) != 8:
+            raise ValueError(f"Invalid FEN: {fen} - Expected 8 ranks")
+        for rank_idx, rank in enumerate(ranks):
+            file_idx = 0
+            for char in rank:
+                if char.isdigit():
+                    file_idx += int(char)
+                elif char in FEN_PIECE_MAP:
+                    piece_type, color = FEN_PIECE_MAP[char]
+                    self._put((7 - rank_idx) * 8 + file_idx, piece_type | (color << 3))
+                    file_idx += 1
+                else:
+                    raise ValueError(f"Invalid piece character: {char}")
+            if file_idx != 8:
+                raise ValueError(f"Invalid FEN: {fen} - Rank {rank_idx} has {file_idx} files")
+
+        if len(parts) > 1:
+            self.turn = parts[1].lower() != "b"
+        if len(parts) > 2:
+            for char, right in (
+                ("K", WHITE_KINGSIDE),
+                ("Q", WHITE_QUEENSIDE),
+                ("k", BLACK_KINGSIDE),
+                ("q", BLACK_QUEENSIDE),
+            ):
+                if char in parts[2]:
+                    self.castling |= right
+        if len(parts) > 3 and parts[3] != "-":
+            self.ep_square = SQUARE_NAMES.index(parts[3])
+        if len(parts) > 5:
+            self.halfmove_clock = int(parts[4])
+            self.fullmove_number = int(parts[5])
+
+    def _put(self, sq, code):
+        bit = 1 << sq
+        self.key ^= ZOBRIST_PIECES[code][sq]
+        self.psq += PSQ[code][sq]
+        self.mailbox[sq] = code
+        self.by_type[code & 7] |= bit
+        self.occupied_co[code >> 3] |= bit
+
+    def _remove(self, sq):
+        code = self.mailbox[sq]
+        bit = ~(1 << sq)
+        self.key ^= ZOBRIST_PIECES[code][sq]
+        self.psq -= PSQ[code][sq]
+        self.mailbox[sq] = 0
+        self.by_type[code & 7] &= bit
+        self.occupied_co[code >> 3] &= bit
+        return code
+
+    @property
+    def occupied(self):
+        return self.occupied_co[0] | self.occupied_co[1]
+
+    @property
+    def fen(self):
+        rows = []
+        for rank in range(7, -1, -1):
+            row = ""
+            empty = 0
+            for file in range(8):
+                code = self.mailbox[rank * 8 + file]
+                if code:
+                    if empty:
+                        row += str(empty)
+                        empty = 0
+                    row += PIECE_SYMBOLS[code]
+                else:
+                    empty += 1
+            if empty:
+                row += str(empty)
+            rows.append(row)
+        castling = "".join(
+            char
+            for char, right in (
+                ("K", WHITE_KINGSIDE),
+                ("Q", WHITE_QUEENSIDE),
+                ("k", BLACK_KINGSIDE),
+                ("q", BLACK_QUEENSIDE),
+            )
+            if self.castling & right
+        )
+        return " ".join(
+            [
+                "/".join(rows),
+                "w" if self.turn else "b",
+                castling or "-",
+                SQUARE_NAMES[self.ep_square] if self.ep_square is not None else "-",
+                str(self.halfmove_clock),
+                str(self.fullmove_number),
+            ]
+        )
+
+    def copy(self):
+        board = BitBoard.__new__(BitBoard)
+        board.mailbox = self.mailbox[:]
+        board.by_type = self.by_type[:]
+        board.occupied_co = self.occupied_co[:]
+        board.turn = self.turn
+        board.castling = self.castling
+        board.ep_square = self.ep_square
+        board.halfmove_clock = self.halfmove_clock
+        board.fullmove_number = self.fullmove_number
+        board.key = self.key
+        board.psq = self.psq
+        board._stack = []
+        return board
+
+    def piece_at(self, square) -> Optional[Piece]:
+        return PIECE_OBJECTS.get(self.mailbox[square])
+
+    def king(self, color):
+        bb = self.by_type[KING] & self.occupied_co[color]
+        return bb.bit_length() - 1 if bb else None
+
+    def attackers_mask(self, color, sq, occupied=None):
+        if occupied is None:
+            occupied = self.occupied
+        by_type = self.by_type
+        queens = by_type[QUEEN]
+        attackers = (
+            (KNIGHT_ATTACKS[sq] & by_type[KNIGHT])
+            | (KING_ATTACKS[sq] & by_type[KING])
+            | (PAWN_ATTACKS[not color][sq] & by_type[PAWN])
+            | (rook_attacks(sq, occupied) & (by_type[ROOK] | queens))
+            | (bishop_attacks(sq, occupied) & (by_type[BISHOP] | queens))
+        )
+        return attackers & self.occupied_co[color]
+
+    def is_attacked_by(self, color, sq):
+        return bool(self.attackers_mask(color, sq))
+
+    def is_check(self):
+        king = self.king(self.turn)
+        return king is not None and self.is_attacked_by(not self.turn, king)
+
+    def _pinned(self, color, king):
+        occupied = self.occupied
+        them = self.occupied_co[not color]
+        by_type = self.by_type
+        snipers = (rook_attacks(king, 0) & (by_type[ROOK] | by_type[QUEEN]) & them) | (
+            bishop_attacks(king, 0) & (by_type[BISHOP] | by_type[QUEEN]) & them
+        )
+        pinned = 0
+        between = BETWEEN[king]
+        for sniper in iter_squares(snipers):
+            blockers = between[sniper] & occupied
+            if blockers and not blockers & (blockers - 1):
+                pinned |= blockers
+        return pinned & self.occupied_co[color]
+
+    def pseudo_legal_moves(self) -> List[int]:
+        moves = []
+        append = moves.append
+        color = self.turn
+        us = self.occupied_co[color]
+        them = self.occupied_co[not color]
+        occupied = us | them
+        by_type = self.by_type
+
+        for frm in iter_squares(by_type[KNIGHT] & us):
+            for to in iter_squares(KNIGHT_ATTACKS[frm] & ~us):
+                append(frm | (to << 6))
+        for frm in iter_squares((by_type[BISHOP] | by_type[QUEEN]) & us):
+            for to in iter_squares(bishop_attacks(frm, occupied) & ~us):
+                append(frm | (to << 6))
+        for frm in iter_squares((by_type[ROOK] | by_type[QUEEN]) & us):
+            for to in iter_squares(rook_attacks(frm, occupied) & ~us):
+                append(frm | (to << 6))
+        for frm in iter_squares(by_type[KING] & us):
+            for to in iter_squares(KING_ATTACKS[frm] & ~us):
+                append(frm | (to << 6))
+
+        pawns = by_type[PAWN] & us
+        targets = them
+        if self.ep_square is not None:
+            targets |= 1 << self.ep_square
+        if color == WHITE:
+            single = (pawns << 8) & ~occupied & BB_ALL
+            double = ((single & (0xFF << 16)) << 8) & ~occupied
+            forward, last_rank = -8, BB_RANK_8
+        else:
+            single = (pawns >> 8) & ~occupied
+            double = ((single & (0xFF << 40)) >> 8) & ~occupied
+            forward, last_rank = 8, BB_RANK_1
+        for frm in iter_squares(pawns):
+            for to in iter_squares(PAWN_ATTACKS[color][frm] & targets):
+                if (1 << to) & last_rank:
+                    for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        append(frm | (to << 6) | (promotion << 12))
+                else:
+                    append(frm | (to << 6))
+        for to in iter_squares(single):
+            frm = to + forward
+            if (1 << to) & last_rank:
+                for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                    append(frm | (to << 6) | (promotion << 12))
+            else:
+                append(frm | (to << 6))
+        for to in iter_squares(double):
+            append((to + 2 * forward) | (to << 6))
+
+        self._castling_moves(color, occupied, append)
+        return moves
+
+    def _castling_moves(self, color, occupied, append):
+        if color == WHITE:
+            rights = self.castling & (WHITE_KINGSIDE | WHITE_QUEENSIDE)
+            king, kingside, queenside = 4, WHITE_KINGSIDE, WHITE_QUEENSIDE
+        else:
+            rights = self.castling & (BLACK_KINGSIDE | BLACK_QUEENSIDE)
+            king, kingside, queenside = 60, BLACK_KINGSIDE, BLACK_QUEENSIDE
+        if not rights or self.mailbox[king] != KING | (color << 3):
+            return
+        enemy = not color
+        if self.is_attacked_by(enemy, king):
+            return
+        if (
+            rights & kingside
+            and not occupied & (3 << (king + 1))
+            and self.mailbox[king + 3] == ROOK | (color << 3)
+            and not self.is_attacked_by(enemy, king + 1)
+            and not self.is_attacked_by(enemy, king + 2)
+        ):
+            append(king | ((king + 2) << 6))
+        if (
+            rights & queenside
+            and not occupied & (7 << (king - 3))
+            and self.mailbox[king - 4] == ROOK | (color << 3)
+            and not self.is_attacked_by(enemy, king - 1)
+            and not self.is_attacked_by(enemy, king - 2)
+        ):
+            append(king | ((king - 2) << 6))
+
+    @property
+    def legal_moves(self) -> List[int]:
+        color = self.turn
+        king = self.king(color)
+        moves = self.pseudo_legal_moves()
+        if king is None:
+            return moves
+
+        enemy = not color
+        if self.is_attacked_by(enemy, king):
+            legal = []
+            for move in moves:
+                self.push(move)
+                if not self.is_attacked_by(enemy, self.king(color)):
+                    legal.append(move)
+                self.pop()
+            return legal
+
+        # Outside of check only king steps, pinned pieces and en passant
+        # captures can expose the king.
+        pinned = self._pinned(color, king)
+        ep_square = self.ep_square
+        mailbox = self.mailbox
+        legal = []
+        for move in moves:
+            frm = move & 63
+            if frm == king:
+                to = (move >> 6) & 63
+                if abs(to - frm) != 2 and self.is_attacked_by(enemy, to):
+                    continue
+            elif (pinned >> frm) & 1 or (
+                (move >> 6) & 63 == ep_square and mailbox[frm] & 7 == PAWN
+            ):
+                self.push(move)
+                attacked = self.is_attacked_by(enemy, king)
+                self.pop()
+                if attacked:
+                    continue
+            legal.append(move)
+        return legal
+
+    def push(self, move):
+        frm = move & 63
+        to = (move >> 6) & 63
+        promotion = move >> 12
+        color = self.turn
+        mailbox = self.mailbox
+
+        code = mailbox[frm]
+        piece_type = code & 7
+        key = self.key
+        captured = mailbox[to]
+        if captured:
+            self._remove(to)
+        elif piece_type == PAWN and to == self.ep_square:
+            captured = self._remove(to - 8 if color == WHITE else to + 8)
+        self._stack.append(
+            (move, captured, self.castling, self.ep_square, self.halfmove_clock, key)
+        )
+        key_state = ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_BLACK
+        if self.ep_square is not None:
+            key_state ^= ZOBRIST_EP[self.ep_square & 7]
+
+        self._remove(frm)
+        if piece_type == PAWN:
+            if promotion:
+                code = promotion | (color << 3)
+        elif piece_type == KING and abs(to - frm) == 2:
+            if to > frm:
+                self._put(frm + 1, self._remove(frm + 3))
+            else:
+                self._put(frm - 1, self._remove(frm - 4))
+        self._put(to, code)
+
+        self.castling &= CASTLING_MASK[frm] & CASTLING_MASK[to]
+        self.ep_square = None
+        if piece_type == PAWN and abs(to - frm) == 16:
+            ep = (frm + to) >> 1
+            if PAWN_ATTACKS[color][ep] & self.by_type[PAWN] & self.occupied_co[not color]:
+                self.ep_square = ep
+        key_state ^= ZOBRIST_CASTLING[self.castling]
+        if self.ep_square is not None:
+            key_state ^= ZOBRIST_EP[self.ep_square & 7]
+        self.key ^= key_state
+        if piece_type == PAWN or captured:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if color == BLACK:
+            self.fullmove_number += 1
+        self.turn = not color
+
+    def pop(self):
+        move, captured, castling, ep_square, halfmove_clock, key = self._stack.pop()
+        frm = move & 63
+        to = (move >> 6) & 63
+        self.turn = color = not self.turn
+        if color == BLACK:
+            self.fullmove_number -= 1
+
+        code = self._remove(to)
+        piece_type = code & 7
+        if move >> 12:
+            code = PAWN | (color << 3)
+        elif piece_type == KING and abs(to - frm) == 2:
+            if to > frm:
+                self._put(frm + 3, self._remove(frm + 1))
+            else:
+                self._put(frm - 4, self._remove(frm - 1))
+        self._put(frm, code)
+        if captured:
+            if piece_type == PAWN and to == ep_square:
+                self._put(to - 8 if color == WHITE else to + 8, captured)
+            else:
+                self._put(to, captured)
+
+        self.castling = castling
+        self.ep_square = ep_square
+        self.halfmove_clock = halfmove_clock
+        self.key = key
+        return move
+
+    def parse_san(self, san):
+        """Return the legal move written as ``san``; raise ValueError otherwise."""
+        san = san.rstrip("+#!?")
+        if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+            king = self.king(self.turn)
+            step = 2 if len(san) == 3 else -2
+            for move in self.legal_moves:
+                if move & 63 == king and (move >> 6) & 63 == king + step:
+                    return move
+            raise ValueError(f"illegal castling {san!r}")
+
+        match = SAN_PATTERN.match(san)
+        if match is None:
+            raise ValueError(f"invalid SAN {san!r}")
+        piece, from_file, from_rank, to, promotion = match.groups()
+        piece_type = SAN_PIECES[piece] if piece else PAWN
+        to = SQUARE_NAMES.index(to)
+        promotion = SAN_PIECES[promotion] if promotion else 0
+
+        found = None
+        for move in self.legal_moves:
+            frm = move & 63
+            if (
+                (move >> 6) & 63 != to
+                or self.mailbox[frm] & 7 != piece_type
+                or move >> 12 != promotion
+                or (from_file and SQUARE_NAMES[frm][0] != from_file)
+                or (from_rank and SQUARE_NAMES[frm][1] != from_rank)
+            ):
+                continue
+            if found is not None:
+                raise ValueError(f"ambiguous SAN {san!r}")
+            found = move
+        if found is None:
+            raise ValueError(f"illegal SAN {san!r}")
+        return found
+
+    def san(self, move):
+        """Standard algebraic notation of ``move``, which must be legal."""
+        frm, to, promotion = move & 63, (move >> 6) & 63, move >> 12
+        piece_type = self.mailbox[frm] & 7
+        if piece_type == KING and abs(to - frm) == 2:
+            san = "O-O" if to > frm else "O-O-O"
+        else:
+            capture = self.mailbox[to] or (piece_type == PAWN and to == self.ep_square)
+            if piece_type == PAWN:
+                san = SQUARE_NAMES[frm][0] + "x" if capture else ""
+            else:
+                san = PIECE_SYMBOLS[piece_type | 8]
+                rivals = [
+                    m & 63
+                    for m in self.legal_moves
+                    if (m >> 6) & 63 == to and m & 63 != frm and self.mailbox[m & 63] & 7 == piece_type
+                ]
+                if rivals:
+                    if all(r & 7 != frm & 7 for r in rivals):
+                        san += SQUARE_NAMES[frm][0]
+                    elif all(r >> 3 != frm >> 3 for r in rivals):
+                        san += SQUARE_NAMES[frm][1]
+                    else:
+                        san += SQUARE_NAMES[frm]
+                if capture:
+                    san += "x"
+            san += SQUARE_NAMES[to]
+            if promotion:
+                san += "=" + PROMOTION_CHARS[promotion].upper()
+        self.push(move)
+        if self.is_check():
+            san += "+" if self.legal_moves else "#"
+        self.pop()
+        return san
+
+    def __str__(self):
+        result = []
+        for rank in range(7, -1, -1):
+            row = []
+            for file in range(8):
+                code = self.mailbox[rank * 8 + file]
+                row.append(PIECE_SYMBOLS[code] if code else ".")
+            result.append(" ".join(row))
+        return "\n".join(result)
+
+
+def perft(board, depth):
+    """Count the leaf nodes of the legal move tree below ``board``."""
+    moves = board.legal_moves
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
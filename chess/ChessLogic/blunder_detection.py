@@ -2,30 +2,105 @@ import sys
 import re
 from typing import Tuple, Optional
 
-from .chess_wrapper import BlunderDetector, CHESS_AVAILABLE
+from .bitboard import BitBoard
+from .chess_wrapper import (
+    ANALYSIS_UNAVAILABLE,
+    BEST_MOVE_RESULT,
+    BlunderDetector,
+    CHESS_AVAILABLE,
+    DEFAULT_DEPTH,
+)
+from .engine_service import ENGINE_SERVICE
+from .eval_cache import EVAL_CACHE
+from .metrics import METRICS
+from .opening_book import get_opening_book
 
 
 class ChessBlunderDetector:
-    def __init__(self):
+    def __init__(self, cache=None, engine=None, book=None):
         self.blunder_detector = BlunderDetector()
         self.chess_available = CHESS_AVAILABLE
+        self.cache = EVAL_CACHE if cache is None else cache
+        self.engine = ENGINE_SERVICE if engine is None else engine
+        self.book = get_opening_book() if book is None else book
 
-    def detect_blunder(self, fen_before: str, fen_after: str) -> Tuple[bool, str]:
+    def is_book_move(self, fen_before, fen_after):
+        if not self.book:
+            return False
+        board = BitBoard(fen_before)
+        placement = fen_after.split()[0]
+        for move, _ in self.book.moves(board):
+            board.push(move)
+            played = board.fen.split()[0] == placement
+            board.pop()
+            if played:
+                return True
+        return False
+
+    def analyze_many(self, jobs):
+        """Search every (fen, depth) in ``jobs`` at once on the engine pool.
+
+        Returns (score, best_move, reached_depth) per job. reached_depth is
+        below the requested depth when the search timed out, and 0 when not
+        even one ply finished or the engine failed; the score is then
+        meaningless. Every search starts from an empty table, so a result is
+        the same whether it comes from the cache or from the engine.
+        """
+        results = [None] * len(jobs)
+        pending = []
+        for i, (fen, depth) in enumerate(jobs):
+            cached = self.cache.get(fen, depth)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append((i, fen, depth, self.engine.submit(fen, depth, fresh=True)))
+
+        for i, fen, depth, future in pending:
+            score, best_move, reached_depth, _ = self.engine.wait(future, fen)
+            # a search cut short by its deadline, or one that failed, is not
+            # the answer for ``depth`` and must not be served as one later
+            if best_move is not None and reached_depth >= depth:
+                self.cache.put(fen, score, best_move, depth)
+            results[i] = (score, best_move, reached_depth)
+        return results
+
+    def detect_blunder(
+        self, fen_before: str, fen_after: str, depth: int = DEFAULT_DEPTH
+    ) -> Tuple[bool, str]:
         if not self.chess_available:
             return False, "Chess analysis is not available."
 
         try:
-            return self.blunder_detector.detect_blunder(fen_before, fen_after)
+            if self.is_book_move(fen_before, fen_after):
+                METRICS.inc("chess_book_hits_total")
+                return False, "Book move."
+
+            (eval_before, best_move, reached), (eval_after, _, reached_after) = (
+                self.analyze_many([(fen_before, depth), (fen_after, max(1, depth - 1))])
+            )
+            # fen_after may be mate or stalemate and have no best move, fen_before can't
+            if reached < 1 or reached_after < 1 or best_move is None:
+                return ANALYSIS_UNAVAILABLE
+            if best_move == self.blunder_detector.played_move(fen_before, fen_after):
+                return BEST_MOVE_RESULT
+            return self.blunder_detector.judge_move(
+                fen_before, eval_before, eval_after, best_move
+            )
         except Exception as e:
             print(f"Error in blunder detection: {e}")
             return False, f"Error analyzing move: {str(e)}"
 
-    def analyze_position(self, fen: str) -> Tuple[float, Optional[str]]:
+    def analyze_position(
+        self, fen: str, depth: int = DEFAULT_DEPTH
+    ) -> Tuple[float, Optional[str]]:
         if not self.chess_available:
             return None
 
         try:
-            return self.blunder_detector.analyze_position(fen)
+            score, best_move, reached_depth = self.analyze_many([(fen, depth)])[0]
+            if reached_depth < 1:
+                return None
+            return score, best_move
         except Exception as e:
             print(f"Error in position analysis: {e}")
             return None
@@ -0,0 +1,137 @@
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from decouple import config
+
+from .chess_wrapper import BlunderDetector, DEFAULT_DEPTH
+from .metrics import METRICS
+
+ENGINE_WORKERS = config("CHESS_ENGINE_WORKERS", default=os.cpu_count() or 1, cast=int)
+ENGINE_TIMEOUT = config("CHESS_ENGINE_TIMEOUT", default=10.0, cast=float)
+
+WARMUP_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# one detector per worker process, built by _init_worker
+_worker_detector = None
+
+
+def _init_worker():
+    global _worker_detector
+    _worker_detector = BlunderDetector()
+    # a tiny search pulls in the attack tables, Zobrist keys and psq tables
+    # before the first real job arrives
+    _worker_detector.analyze_position(WARMUP_FEN, 1)
+    METRICS.drain()
+
+
+def _search(detector, fen, depth, timeout, fresh=False):
+    # the clock starts when a worker picks the job up, time spent queued
+    # behind other jobs does not count against it
+    deadline = time.monotonic() + timeout if timeout else None
+    if not fresh:
+        detector.tt.new_search()
+    return detector.search_position(fen, depth, deadline, fresh)
+
+
+def _run_job(fen, depth, timeout, fresh=False):
+    if _worker_detector is None:
+        _init_worker()
+    result = _search(_worker_detector, fen, depth, timeout, fresh)
+    # counters live in the worker, ship what this job added to the parent
+    return result, METRICS.drain()
+
+
+class EngineService:
+    """Runs position searches in a pool of long-lived worker processes.
+
+    Each worker keeps its own detector and transposition table between
+    jobs. With ``workers=0`` jobs run in the calling process instead.
+    """
+
+    def __init__(self, workers=ENGINE_WORKERS, timeout=ENGINE_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = None
+        self._local = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the web server has threads running
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def submit(self, fen, depth=DEFAULT_DEPTH, timeout=None, fresh=False):
+        """Queue a search of ``fen`` and return its Future.
+
+        The worker stops searching ``timeout`` seconds after it starts the
+        job and answers with the deepest finished iteration. ``fresh`` jobs
+        do not use the worker's table, see ``BlunderDetector.search_position``.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if self.workers <= 0:
+            return self._run_local(fen, depth, timeout, fresh)
+        try:
+            return self._pool().submit(_run_job, fen, depth, timeout, fresh)
+        except BrokenProcessPool:
+            print("Engine pool broke, restarting it")
+            self.shutdown(wait=False)
+            return self._pool().submit(_run_job, fen, depth, timeout, fresh)
+
+    def analyze(self, fen, depth=DEFAULT_DEPTH, timeout=None):
+        """Search ``fen`` and wait for the result, see ``wait``."""
+        return self.wait(self.submit(fen, depth, timeout), fen)
+
+    def wait(self, future, fen, timeout=None):
+        """(score, best_move, reached_depth, timed_out) of a submitted search.
+
+        Every job bounds its own search time once it starts, so by default
+        this waits as long as the job sits in the queue; ``timeout`` caps the
+        wait itself. A failed or abandoned job gives (0.0, None, 0, timed_out)
+        like ``BlunderDetector.search_position`` does.
+        """
+        try:
+            result, deltas = future.result(timeout=timeout)
+            METRICS.inc_many(deltas)
+            return result
+        except TimeoutError:
+            future.cancel()
+            print(f"Engine timed out on {fen}")
+            return 0.0, None, 0, True
+        except Exception as e:
+            print(f"Engine error on {fen}: {e}")
+        return 0.0, None, 0, False
+
+    def _run_local(self, fen, depth, timeout, fresh=False):
+        if self._local is None:
+            self._local = BlunderDetector()
+        future = Future()
+        try:
+            future.set_result((_search(self._local, fen, depth, timeout, fresh), {}))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+
+
+ENGINE_SERVICE = EngineService()
+atexit.register(ENGINE_SERVICE.shutdown, wait=False)
+METRICS.register(
+    "chess_engine_workers", "Engine worker processes, 0 when searching in-process.",
+    lambda: max(0, ENGINE_SERVICE.workers),
+)
@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+
+from decouple import config
+
+from .metrics import METRICS
+
+
+def normalize_fen(fen):
+    # move clocks do not change the evaluation, so they are not part of the key
+    parts = fen.split()
+    parts += ["w", "-", "-"][len(parts) - 1 :]
+    return " ".join(parts[:4])
+
+
+class EvalCache:
+    """Thread-safe LRU map of (normalized FEN, depth) -> (score, best_move, depth).
+
+    A deeper result is not served for a shallower request: it would make
+    the answer depend on what happened to be searched before.
+    """
+
+    def __init__(self, maxsize=50000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, fen, depth):
+        key = (normalize_fen(fen), depth)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def put(self, fen, score, best_move, depth):
+        key = (normalize_fen(fen), depth)
+        with self._lock:
+            self._data[key] = (score, best_move, depth)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+EVAL_CACHE = EvalCache(maxsize=config("CHESS_EVAL_CACHE_SIZE", default=50000, cast=int))
+METRICS.register(
+    "chess_eval_cache_hits_total", "Evaluation cache hits.", lambda: EVAL_CACHE.hits, "counter"
+)
+METRICS.register(
+    "chess_eval_cache_misses_total", "Evaluation cache misses.", lambda: EVAL_CACHE.misses, "counter"
+)
+METRICS.register("chess_eval_cache_size", "Positions in the evaluation cache.", lambda: len(EVAL_CACHE))
@@ -0,0 +1,68 @@
+from .bitboard import (
+    WHITE,
+    BLACK,
+    PAWN,
+    KNIGHT,
+    BISHOP,
+    ROOK,
+    QUEEN,
+    KNIGHT_ATTACKS,
+    bishop_attacks,
+    rook_attacks,
+    iter_squares,
+)
+
+KNIGHT_MOBILITY = 4
+BISHOP_MOBILITY = 4
+ROOK_MOBILITY = 2
+QUEEN_MOBILITY = 1
+DOUBLED_PAWN_PENALTY = 20
+
+FILE_MASKS = [0x0101010101010101 << f for f in range(8)]
+
+
+def popcount(bb):
+    return bin(bb).count("1")
+
+
+def mobility(board, color):
+    us = board.occupied_co[color]
+    occupied = board.occupied
+    by_type = board.by_type
+    score = 0
+    for sq in iter_squares(by_type[KNIGHT] & us):
+        score += KNIGHT_MOBILITY * popcount(KNIGHT_ATTACKS[sq] & ~us)
+    for sq in iter_squares(by_type[BISHOP] & us):
+        score += BISHOP_MOBILITY * popcount(bishop_attacks(sq, occupied) & ~us)
+    for sq in iter_squares(by_type[ROOK] & us):
+        score += ROOK_MOBILITY * popcount(rook_attacks(sq, occupied) & ~us)
+    for sq in iter_squares(by_type[QUEEN] & us):
+        score += QUEEN_MOBILITY * popcount(
+            (rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)) & ~us
+        )
+    return score
+
+
+def doubled_pawns(board, color):
+    pawns = board.by_type[PAWN] & board.occupied_co[color]
+    extra = 0
+    for mask in FILE_MASKS:
+        count = popcount(pawns & mask)
+        if count > 1:
+            extra += count - 1
+    return extra
+
+
+def evaluate(board):
+    """Static evaluation in centipawns from white's point of view.
+
+    Material and piece-square terms are read from ``board.psq``, which the
+    board keeps up to date on every push/pop; only mobility and pawn
+    structure are computed here, once per side.
+    """
+    score = board.psq
+    score += mobility(board, WHITE) - mobility(board, BLACK)
+    score -= DOUBLED_PAWN_PENALTY * (
+        doubled_pawns(board, WHITE) - doubled_pawns(board, BLACK)
+    )
+    return score
@@ -0,0 +1,191 @@
+import threading
+from collections import OrderedDict
+
+from decouple import config
+
+from .chess_wrapper import (
+    BLUNDER_THRESHOLD,
+    MISTAKE_THRESHOLD,
+    SMALL_MISTAKE_THRESHOLD,
+)
+from .metrics import METRICS
+
+REPORT_DEPTH = 2
+# mate scores are clamped so a missed mate counts as a blunder, not as 999 pawns
+MAX_REPORT_SCORE = 1000
+
+SUMMARY_KEYS = {
+    "inaccuracy": "inaccuracies",
+    "mistake": "mistakes",
+    "blunder": "blunders",
+}
+
+
+def classify(loss):
+    if loss > BLUNDER_THRESHOLD:
+        return "blunder"
+    elif loss > MISTAKE_THRESHOLD:
+        return "mistake"
+    elif loss > SMALL_MISTAKE_THRESHOLD:
+        return "inaccuracy"
+    return None
+
+
+class GameReport:
+    """Incremental per-ply analysis of one game.
+
+    Every position of the game is searched exactly once: the score after
+    ply n is also the score before ply n + 1. ``update`` only analyses the
+    history entries appended since the previous call, and starts over when
+    the history no longer extends what was analysed (an undo). Positions
+    the engine did not finish have no score, the plies around them are
+    marked unavailable and searched again by the next ``update``.
+    """
+
+    def __init__(self, detector, depth=REPORT_DEPTH):
+        self.detector = detector
+        self.depth = depth
+        self.moves = []
+        # white-POV centipawns for every position, len(moves) + 1 once started,
+        # None where the search did not finish
+        self.evals = []
+        self.best_moves = []
+        self.plies = []
+        self._lock = threading.Lock()
+        # as_dict() of the last finished update, readable while one runs
+        self.latest = self.as_dict()
+
+    def reset(self):
+        self.moves = []
+        self.evals = []
+        self.best_moves = []
+        self.plies = []
+
+    def update(self, game):
+        with self._lock:
+            if game.moves[: len(self.moves)] != self.moves:
+                self.reset()
+            elif None in self.evals:
+                self.truncate(self.evals.index(None))
+            start = len(self.moves)
+            if len(game.moves) > start or not self.evals:
+                self._extend(game, start)
+            self.latest = self.as_dict()
+            return self.latest
+
+    def is_current(self, moves):
+        """Whether the report covers exactly ``moves`` with nothing left to retry."""
+        return self.moves == moves and bool(self.evals) and None not in self.evals
+
+    def truncate(self, positions):
+        """Forget everything from position ``positions`` on."""
+        if positions == 0:
+            self.reset()
+            return
+        del self.evals[positions:]
+        del self.best_moves[positions:]
+        del self.plies[positions - 1 :]
+        del self.moves[positions - 1 :]
+
+    def snapshot(self):
+        """The report as of the last finished ``update``, never waits for one."""
+        return self.latest
+
+    def _extend(self, game, start):
+        positions = list(game.iter_positions(start))
+        fens = [fen for fen, _, _ in positions]
+        if self.evals:
+            # the first position was analysed as the last one of the previous call
+            fens = fens[1:]
+        unpacked = [(move, color) for _, color, move in positions[:-1]]
+
+        results = self.detector.analyze_many([(fen, self.depth) for fen in fens])
+        for score, best_move, reached_depth in results:
+            if reached_depth < 1:
+                score = None
+            else:
+                score = max(-MAX_REPORT_SCORE, min(MAX_REPORT_SCORE, score))
+            self.evals.append(score)
+            self.best_moves.append(best_move)
+
+        for i, (move, color) in enumerate(unpacked):
+            ply = start + i
+            played = game.translate(move["op"]) + game.translate(move["np"])
+            before, after = self.evals[ply], self.evals[ply + 1]
+            if before is None or after is None:
+                self.plies.append(
+                    {
+                        "ply": ply + 1,
+                        "color": color,
+                        "move": played,
+                        "eval": None if after is None else after / 100,
+                        "loss": None,
+                        "best_move": self.best_moves[ply],
+                        "class": None,
+                        "status": "unavailable",
+                    }
+                )
+                continue
+            loss = before - after
+            if color == "black":
+                loss = -loss
+            best = self.best_moves[ply]
+            self.plies.append(
+                {
+                    "ply": ply + 1,
+                    "color": color,
+                    "move": played,
+                    "eval": after / 100,
+                    "loss": max(0, loss) / 100,
+                    "best_move": best,
+                    "class": classify(loss) if best != played else None,
+                    "status": "done",
+                }
+            )
+        self.moves = list(game.moves)
+
+    def as_dict(self):
+        summary = {
+            color: {key: 0 for key in SUMMARY_KEYS.values()}
+            for color in ("white", "black")
+        }
+        for entry in self.plies:
+            if entry["class"] is not None:
+                summary[entry["color"]][SUMMARY_KEYS[entry["class"]]] += 1
+        return {
+            "depth": self.depth,
+            "eval_curve": [None if score is None else score / 100 for score in self.evals],
+            "summary": summary,
+            # a copy: the next update appends to self.plies while this is served
+            "plies": list(self.plies),
+        }
+
+
+class ReportCache:
+    """Bounded LRU of GameReport objects keyed by game id."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, detector):
+        with self._lock:
+            report = self._data.get(key)
+            if report is None:
+                report = self._data[key] = GameReport(detector)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return report
+
+    def __len__(self):
+        return len(self._data)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+REPORT_CACHE = ReportCache(maxsize=config("CHESS_REPORT_CACHE_SIZE", default=256, cast=int))
+METRICS.register("chess_report_cache_games", "Games with a cached report.", lambda: len(REPORT_CACHE))
@@ -0,0 +1,83 @@
+import threading
+
+COUNTERS = {
+    "chess_search_nodes_total": "Nodes visited by the search, quiescence included.",
+    "chess_search_movegen_total": "Legal move generations made by the search.",
+    "chess_search_evaluations_total": "Static evaluations made by the search.",
+    "chess_search_timeouts_total": "Searches stopped by their deadline.",
+    "chess_tt_hits_total": "Transposition table probes that found the position.",
+    "chess_tt_misses_total": "Transposition table probes that did not.",
+    "chess_analyses_total": "Positions analysed by BlunderDetector.",
+    "chess_analysis_seconds_total": "Wall time spent analysing positions.",
+    "chess_book_hits_total": "Moves judged from the opening book without search.",
+}
+
+
+def format_value(value):
+    # :g would round counters past six digits, 1234567 -> 1.23457e+06
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metrics:
+    """In-process counters plus gauges read at scrape time.
+
+    Counters are plain floats behind one lock; callers that count in a tight
+    loop keep a local tally and ``inc`` once at the end.
+    """
+
+    def __init__(self, counters=COUNTERS):
+        self.help = dict(counters)
+        self.values = {name: 0.0 for name in counters}
+        # name -> (help, type, callback)
+        self.callbacks = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self.values[name] += value
+
+    def inc_many(self, deltas):
+        with self._lock:
+            for name, value in deltas.items():
+                self.values[name] += value
+
+    def drain(self):
+        """Return the counts since the last drain and zero them (pool workers)."""
+        with self._lock:
+            deltas = {name: value for name, value in self.values.items() if value}
+            for name in deltas:
+                self.values[name] = 0.0
+            return deltas
+
+    def register(self, name, help_text, callback, kind="gauge"):
+        self.callbacks[name] = (help_text, kind, callback)
+
+    def render(self):
+        """Prometheus text exposition format."""
+        with self._lock:
+            values = dict(self.values)
+        lines = []
+        for name, value in values.items():
+            lines += [
+                f"# HELP {name} {self.help[name]}",
+                f"# TYPE {name} counter",
+                f"{name} {format_value(value)}",
+            ]
+        for name, (help_text, kind, callback) in self.callbacks.items():
+            try:
+                value = callback()
+            except Exception as e:
+                print(f"Error reading metric {name}: {e}")
+                continue
+            lines += [
+                f"# HELP {name} {help_text}",
+                f"# TYPE {name} {kind}",
+                f"{name} {format_value(value)}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
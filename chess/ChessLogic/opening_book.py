@@ -0,0 +1,112 @@
+import mmap
+import os
+import struct
+import threading
+
+from decouple import config
+
+from .bitboard import ZOBRIST_CASTLING, ZOBRIST_EP
+
+# (position key, move, weight), sorted by key
+BOOK_RECORD = struct.Struct(">QHH")
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(__file__), "opening.book")
+
+
+def book_key(board):
+    """Zobrist key of the placement and side to move only.
+
+    Castling and en passant are left out, so positions from FENs that
+    record them differently (or not at all) still find their book moves.
+    """
+    key = board.key ^ ZOBRIST_CASTLING[board.castling]
+    if board.ep_square is not None:
+        key ^= ZOBRIST_EP[board.ep_square & 7]
+    return key
+
+
+class OpeningBook:
+    """Read-only book file, memory mapped and binary searched by key."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.size = size // BOOK_RECORD.size
+
+    def __len__(self):
+        return self.size
+
+    def _key_at(self, index):
+        return BOOK_RECORD.unpack_from(self._mm, index * BOOK_RECORD.size)[0]
+
+    def entries(self, key):
+        """All (move, weight) pairs stored for ``key``."""
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        found = []
+        while lo < self.size:
+            record_key, move, weight = BOOK_RECORD.unpack_from(self._mm, lo * BOOK_RECORD.size)
+            if record_key != key:
+                break
+            found.append((move, weight))
+            lo += 1
+        return found
+
+    def moves(self, board):
+        return self.entries(book_key(board))
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+
+def write_book(path, counts):
+    """Write ``{(key, move): count}`` as a sorted book file."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        for (key, move), count in sorted(counts.items()):
+            f.write(BOOK_RECORD.pack(key, move, min(count, 0xFFFF)))
+    os.replace(tmp, path)
+
+
+# None until the first lookup; _NO_BOOK remembers that there was none
+_NO_BOOK = object()
+_book = None
+_book_lock = threading.Lock()
+
+
+def get_opening_book():
+    """The configured book (CHESS_OPENING_BOOK), or None when there is none."""
+    global _book
+    book = _book
+    if book is None:
+        with _book_lock:
+            if _book is None:
+                _book = _load_book()
+            book = _book
+    return None if book is _NO_BOOK else book
+
+
+def _load_book():
+    path = config("CHESS_OPENING_BOOK", default=DEFAULT_BOOK_PATH)
+    if not os.path.exists(path):
+        return _NO_BOOK
+    try:
+        return OpeningBook(path)
+    except OSError as e:
+        print(f"Error opening book {path}: {e}")
+        return _NO_BOOK
+
+
+def reset_opening_book():
+    """Forget the loaded (or missing) book, the next lookup opens the file again."""
+    global _book
+    with _book_lock:
+        _book = None
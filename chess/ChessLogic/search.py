@@ -0,0 +1,241 @@
+import time
+
+from .bitboard import WHITE
+from .metrics import METRICS
+from .transposition import EXACT, LOWER, UPPER
+
+INFINITY = 1 << 30
+MATE_SCORE = 100000
+MATE_THRESHOLD = MATE_SCORE - 1000
+MAX_PLY = 64
+
+# move ordering buckets, higher is searched first
+TT_MOVE_ORDER = 1 << 28
+CAPTURE_ORDER = 1 << 24
+KILLER_ORDER = 1 << 20
+
+# how many nodes are searched between deadline checks
+CHECK_INTERVAL = 1024
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class Searcher:
+    """Iterative deepening negamax with alpha-beta pruning.
+
+    ``evaluate(board)`` must return a static score in centipawns from
+    white's point of view; scores returned by ``search`` are relative to
+    the side to move. If a ``deadline`` (a ``time.monotonic()`` value) is
+    given, the search stops once it passes and returns the result of the
+    last completed iteration.
+    """
+
+    def __init__(self, evaluate, tt):
+        self.evaluate = evaluate
+        self.tt = tt
+        self.nodes = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = [0] * 4096
+        self.pv = [[] for _ in range(MAX_PLY + 2)]
+        self.deadline = None
+        # depth of the last finished iteration, and whether the deadline hit
+        self.reached_depth = 0
+        self.timed_out = False
+        self.movegens = 0
+        self.evaluations = 0
+        self.tt_hits = 0
+        self.tt_probes = 0
+
+    def search(self, board, depth, deadline=None):
+        depth = max(1, depth)
+        entry = self.tt.probe(board.key)
+        if entry is not None and entry[1] >= depth and entry[3] == EXACT and entry[4]:
+            METRICS.inc("chess_tt_hits_total")
+            self.reached_depth, self.timed_out = entry[1], False
+            return entry[2], entry[4], [entry[4]]
+
+        self.nodes = 0
+        self.movegens = self.evaluations = self.tt_hits = self.tt_probes = 0
+        timed_out = False
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = [0] * 4096
+        self.deadline = deadline
+        self.reached_depth = 0
+        score, best_move, pv = 0, None, []
+        for current in range(1, depth + 1):
+            ply_count = len(board._stack)
+            try:
+                iteration = self._negamax(board, current, -INFINITY, INFINITY, 0)
+            except SearchTimeout:
+                timed_out = True
+                while len(board._stack) > ply_count:
+                    board.pop()
+                if best_move is None and self.pv[0]:
+                    # not even depth 1 finished, the partial line is still legal
+                    best_move = self.pv[0][0]
+                    pv = [best_move]
+                break
+            score = iteration
+            self.reached_depth = current
+            if self.pv[0]:
+                pv = self.pv[0][:]
+                best_move = pv[0]
+            if abs(score) >= MATE_THRESHOLD:
+                # a forced mate does not change with more depth
+                self.reached_depth = depth
+                break
+
+        self.timed_out = timed_out
+        METRICS.inc_many(
+            {
+                "chess_search_nodes_total": self.nodes,
+                "chess_search_movegen_total": self.movegens,
+                "chess_search_evaluations_total": self.evaluations,
+                "chess_search_timeouts_total": int(timed_out),
+                "chess_tt_hits_total": self.tt_hits,
+                "chess_tt_misses_total": self.tt_probes - self.tt_hits,
+            }
+        )
+        return score, best_move, pv
+
+    def _check_time(self):
+        if time.monotonic() >= self.deadline:
+            raise SearchTimeout()
+
+    def _static(self, board):
+        self.evaluations += 1
+        score = self.evaluate(board)
+        return score if board.turn == WHITE else -score
+
+    def _negamax(self, board, depth, alpha, beta, ply):
+        self.pv[ply] = []
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiescence(board, alpha, beta, ply)
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes % CHECK_INTERVAL:
+            self._check_time()
+
+        key = board.key
+        tt_move = 0
+        entry = self.tt.probe(key)
+        self.tt_probes += 1
+        if entry is not None:
+            self.tt_hits += 1
+            tt_move = entry[4] or 0
+            if ply > 0 and entry[1] >= depth:
+                score = _from_tt(entry[2], ply)
+                flag = entry[3]
+                if (
+                    flag == EXACT
+                    or (flag == LOWER and score >= beta)
+                    or (flag == UPPER and score <= alpha)
+                ):
+                    return score
+
+        moves = board.legal_moves
+        self.movegens += 1
+        if not moves:
+            return -MATE_SCORE + ply if board.is_check() else 0
+
+        alpha_orig = alpha
+        best_score, best_move = -INFINITY, 0
+        mailbox = board.mailbox
+        for move in self._order(board, moves, tt_move, ply):
+            board.push(move)
+            score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            board.pop()
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    self.pv[ply] = [move] + self.pv[ply + 1]
+                    if score >= beta:
+                        if not mailbox[(move >> 6) & 63] and not move >> 12:
+                            killers = self.killers[ply]
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                            self.history[move & 4095] += depth * depth
+                        break
+
+        if best_score <= alpha_orig:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(key, depth, _to_tt(best_score, ply), flag, best_move)
+        return best_score
+
+    def _quiescence(self, board, alpha, beta, ply):
+        self.pv[ply] = []
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes % CHECK_INTERVAL:
+            self._check_time()
+        moves = board.legal_moves
+        self.movegens += 1
+        if not moves:
+            return -MATE_SCORE + ply if board.is_check() else 0
+
+        stand_pat = self._static(board)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        mailbox = board.mailbox
+        captures = [m for m in moves if mailbox[(m >> 6) & 63] or m >> 12]
+        for move in self._order(board, captures, 0, ply):
+            board.push(move)
+            score = -self._quiescence(board, -beta, -alpha, ply + 1)
+            board.pop()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+                self.pv[ply] = [move] + self.pv[ply + 1]
+        return alpha
+
+    def _order(self, board, moves, tt_move, ply):
+        mailbox = board.mailbox
+        killer_1, killer_2 = self.killers[ply]
+        history = self.history
+        scored = []
+        for move in moves:
+            if move == tt_move:
+                order = TT_MOVE_ORDER
+            else:
+                victim = mailbox[(move >> 6) & 63] & 7
+                if victim or move >> 12:
+                    # most valuable victim, least valuable attacker
+                    attacker = mailbox[move & 63] & 7
+                    order = CAPTURE_ORDER + (victim + (move >> 12)) * 8 - attacker
+                elif move == killer_1:
+                    order = KILLER_ORDER + 1
+                elif move == killer_2:
+                    order = KILLER_ORDER
+                else:
+                    order = history[move & 4095]
+            scored.append((order, move))
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return [move for _, move in scored]
+
+
+# Mate scores are stored relative to the node so they stay valid when the
+# same position is reached at a different ply.
+def _to_tt(score, ply):
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def _from_tt(score, ply):
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
@@ -0,0 +1,106 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# upper bounds of the histogram buckets, in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+
+
+class RequestTimer:
+    """Named spans of one request, reported as a Server-Timing header."""
+
+    def __init__(self):
+        self.spans = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, (time.perf_counter() - start) * 1000))
+
+    def total(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        parts = [f"{name};dur={ms:.2f}" for name, ms in self.spans]
+        parts.append(f"total;dur={self.total():.2f}")
+        return ", ".join(parts)
+
+    def record(self, histogram=None):
+        histogram = PHASE_HISTOGRAM if histogram is None else histogram
+        for name, ms in self.spans:
+            histogram.observe(name, ms)
+        histogram.observe("total", self.total())
+
+
+class NullTimer:
+    def span(self, name):
+        return nullcontext()
+
+
+NULL_TIMER = NullTimer()
+
+
+class PhaseHistogram:
+    """Process-wide latency histogram per phase name."""
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self._phases = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, ms):
+        with self._lock:
+            phase = self._phases.get(name)
+            if phase is None:
+                phase = self._phases[name] = {
+                    "count": 0,
+                    "sum_ms": 0.0,
+                    "max_ms": 0.0,
+                    "counts": [0] * len(self.buckets),
+                }
+            phase["count"] += 1
+            phase["sum_ms"] += ms
+            phase["max_ms"] = max(phase["max_ms"], ms)
+            for i, bound in enumerate(self.buckets):
+                if ms <= bound:
+                    phase["counts"][i] += 1
+                    break
+
+    def _quantile(self, phase, q):
+        # upper bound of the bucket holding the q-th observation
+        target = q * phase["count"]
+        seen = 0
+        for bound, count in zip(self.buckets, phase["counts"]):
+            seen += count
+            if seen >= target:
+                return bound if bound != float("inf") else phase["max_ms"]
+        return phase["max_ms"]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    "count": phase["count"],
+                    "mean_ms": round(phase["sum_ms"] / phase["count"], 3),
+                    "max_ms": round(phase["max_ms"], 3),
+                    "p50_ms": self._quantile(phase, 0.5),
+                    "p95_ms": self._quantile(phase, 0.95),
+                    "p99_ms": self._quantile(phase, 0.99),
+                    "buckets": {
+                        ("le_" + str(bound) if bound != float("inf") else "inf"): count
+                        for bound, count in zip(self.buckets, phase["counts"])
+                    },
+                }
+                for name, phase in self._phases.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._phases = {}
+
+
+PHASE_HISTOGRAM = PhaseHistogram()
@@ -0,0 +1,49 @@
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results indexed by Zobrist key.
+
+    Entries are (key, depth, score, flag, best_move, generation) tuples. A
+    slot is overwritten when it is empty, holds the same position, holds a
+    shallower result, or was written during an older search generation.
+    """
+
+    def __init__(self, size_bits=16):
+        self.size = 1 << size_bits
+        self.mask = self.size - 1
+        self.table = [None] * self.size
+        self.generation = 0
+
+    def probe(self, key):
+        entry = self.table[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, flag=EXACT, best_move=None):
+        index = key & self.mask
+        old = self.table[index]
+        if (
+            old is None
+            or old[0] == key
+            or depth >= old[1]
+            or old[5] != self.generation
+        ):
+            if best_move is None and old is not None and old[0] == key:
+                best_move = old[4]
+            self.table[index] = (key, depth, score, flag, best_move, self.generation)
+
+    def new_search(self):
+        self.generation += 1
+
+    def clear(self):
+        self.table = [None] * self.size
+        self.generation = 0
+
+
+# Shared by every BlunderDetector in the process, so consecutive moves of a
+# game (fen_after of one move is fen_before of the next) hit the table.
+TRANSPOSITION_TABLE = TranspositionTable()
@@ -0,0 +1,98 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from decouple import config
+from django.db import close_old_connections, transaction
+
+from .ChessLogic.ChessBase import ChessGame
+from .ChessLogic.blunder_detection import ChessBlunderDetector
+from .ChessLogic.chess_wrapper import ANALYSIS_UNAVAILABLE
+from .ChessLogic.game_report import REPORT_CACHE
+from .live import publish_analysis
+from .models import MoveAnalysis
+
+ANALYSIS_WORKERS = config("CHESS_ANALYSIS_WORKERS", default=2, cast=int)
+REPORT_WORKERS = config("CHESS_REPORT_WORKERS", default=2, cast=int)
+
+_executor = ThreadPoolExecutor(
+    max_workers=ANALYSIS_WORKERS, thread_name_prefix="chess-analysis"
+)
+# whole-game reports take seconds on a cold cache, keep them from holding
+# up the per-move blunder checks
+_report_executor = ThreadPoolExecutor(
+    max_workers=REPORT_WORKERS, thread_name_prefix="chess-report"
+)
+# game id -> (board, moves, to_move) waiting for a report job; a newer
+# position replaces the queued one instead of queueing another job
+_pending_reports = {}
+_pending_lock = threading.Lock()
+
+
+def queue_analysis(game_id, ply, fen_before, fen_after):
+    """Record a pending analysis for ``ply`` and run it once the move is saved."""
+    analysis, _ = MoveAnalysis.objects.update_or_create(
+        game_id=game_id,
+        ply=ply,
+        defaults={
+            "fen_before": fen_before,
+            "fen_after": fen_after,
+            "status": MoveAnalysis.PENDING,
+            "is_blunder": False,
+            "message": None,
+        },
+    )
+    transaction.on_commit(lambda: _executor.submit(run_analysis, analysis.pk))
+    return analysis
+
+
+def run_analysis(analysis_id):
+    try:
+        analysis = MoveAnalysis.objects.filter(pk=analysis_id).first()
+        if analysis is None:
+            return
+        try:
+            result = ChessBlunderDetector().detect_blunder(
+                analysis.fen_before, analysis.fen_after
+            )
+            analysis.is_blunder, analysis.message = result
+            # analyze_games --retry-failed picks up what the engine didn't finish
+            if result == ANALYSIS_UNAVAILABLE:
+                analysis.status = MoveAnalysis.FAILED
+            else:
+                analysis.status = MoveAnalysis.DONE
+        except Exception as e:
+            print(f"Error analyzing move {analysis.ply} of game {analysis.game_id}: {e}")
+            analysis.message = "Move analyzed..."
+            analysis.status = MoveAnalysis.FAILED
+        analysis.save(update_fields=["is_blunder", "message", "status"])
+        publish_analysis(analysis)
+    finally:
+        # worker threads open their own connections, don't leave them dangling
+        close_old_connections()
+
+
+def queue_report(game_id, game):
+    """Bring the cached report of ``game_id`` up to ``game`` in the background.
+
+    Returns the report as it stands now, which can lag the game by a few
+    plies, or be empty, until the update finishes.
+    """
+    report = REPORT_CACHE.get(game_id, game.blunder_detector)
+    if not report.is_current(game.moves):
+        # the live game keeps changing, the job works on its own copy
+        state = (game.str_board(), list(game.moves), game.to_move)
+        with _pending_lock:
+            queued = game_id in _pending_reports
+            _pending_reports[game_id] = state
+        if not queued:
+            _report_executor.submit(update_report, game_id, report)
+    return report.snapshot()
+
+
+def update_report(game_id, report):
+    try:
+        with _pending_lock:
+            board, moves, to_move = _pending_reports.pop(game_id)
+        report.update(ChessGame(start_string=board, moves=moves, to_move=to_move))
+    except Exception as e:
+        print(f"Error updating game report: {e}")
@@ -0,0 +1,47 @@
+from django.utils.dateparse import parse_date
+
+from .ChessLogic.ChessBase import ChessGame
+from .models import Game
+
+
+def parse_day(value):
+    """``value`` as a date, None when empty; ValueError unless it is YYYY-MM-DD."""
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        # well formed but not a real day, e.g. 2024-02-30
+        day = None
+    if day is None:
+        raise ValueError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+    return day
+
+
+def filter_games(ids=None, since=None, until=None):
+    games = Game.objects.order_by("pk")
+    if ids:
+        games = games.filter(pk__in=ids)
+    if since:
+        games = games.filter(date_created__date__gte=since)
+    if until:
+        games = games.filter(date_created__date__lte=until)
+    return games
+
+
+def iter_pgn(games, fens=False, chunk_size=200):
+    """Yield the PGN of every game in ``games``, one game at a time."""
+    for game in games.only("pk", "board", "moves", "to_move", "date_created", "result").iterator(
+        chunk_size=chunk_size
+    ):
+        moves = game.moves.split(",,") if game.moves else []
+        ng = ChessGame(start_string=game.board, moves=moves, to_move=game.to_move)
+        headers = {
+            "Event": f"Chessmate game {game.pk}",
+            "Date": game.date_created.strftime("%Y.%m.%d"),
+            "Result": game.result,
+        }
+        try:
+            yield ng.export_pgn(headers, fens=fens)
+        except Exception as e:
+            print(f"Error exporting game {game.pk}: {e}")
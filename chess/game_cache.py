@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+
+from decouple import config
+
+from .ChessLogic.ChessBase import ChessGame
+from .ChessLogic.metrics import METRICS
+from .ChessLogic.timing import NULL_TIMER
+from .models import Game
+
+
+class GameCache:
+    """Bounded LRU of live ChessGame objects keyed by game id.
+
+    Entries carry the ``Game.version`` they were built from and are only
+    handed out for that version. ``checkout`` removes the entry, so two
+    requests never mutate the same ChessGame; the request puts it back
+    with ``put`` when it is done.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def checkout(self, game_id, version):
+        with self._lock:
+            entry = self._data.pop(game_id, None)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+            return None
+
+    def put(self, game_id, version, ng, info):
+        with self._lock:
+            self._data[game_id] = (version, ng, info)
+            self._data.move_to_end(game_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, game_id):
+        with self._lock:
+            self._data.pop(game_id, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+GAME_CACHE = GameCache(maxsize=config("CHESS_GAME_CACHE_SIZE", default=512, cast=int))
+METRICS.register("chess_game_cache_hits_total", "Live game cache hits.", lambda: GAME_CACHE.hits, "counter")
+METRICS.register(
+    "chess_game_cache_misses_total", "Live game cache misses.", lambda: GAME_CACHE.misses, "counter"
+)
+METRICS.register("chess_game_cache_games", "Live games held in memory.", lambda: len(GAME_CACHE))
+
+
+def load_game(game_id, timer=NULL_TIMER):
+    """(version, ChessGame, info) for ``game_id``, from the cache when it is current.
+
+    Returns None when the game does not exist. ``timer`` gets the "db" and,
+    on a cache miss, the "rebuild" spans.
+    """
+    with timer.span("db"):
+        version = Game.objects.filter(pk=game_id).values_list("version", flat=True).first()
+        if version is None:
+            return None
+        live = GAME_CACHE.checkout(game_id, version)
+        if live is not None:
+            return (version,) + live
+        game = (
+            Game.objects.filter(pk=game_id)
+            .only("board", "moves", "to_move", "info", "version")
+            .first()
+        )
+    if game is None:
+        return None
+    with timer.span("rebuild"):
+        gmoves = game.moves.split(",,") if game.moves and len(game.moves) > 0 else []
+        ng = ChessGame(start_string=game.board, moves=gmoves, to_move=game.to_move)
+    return game.version, ng, game.info
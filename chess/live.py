@@ -0,0 +1,142 @@
+import asyncio
+import json
+import re
+import threading
+
+from asgiref.sync import sync_to_async
+from decouple import config
+from django.utils.module_loading import import_string
+
+from .ChessLogic.metrics import METRICS
+from .models import Game
+
+GAME_SOCKET_PATH = re.compile(r"^/ws/game/(\d+)$")
+# close codes in the 4000 range are free for the application
+CLOSE_NOT_FOUND = 4404
+
+
+def _offer(queue, message):
+    # a watcher that falls this far behind loses its oldest events; every
+    # event carries the game version, so the client sees the gap and reloads
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+class LocalHub:
+    """In-process pub/sub of game events.
+
+    Subscribers are asyncio queues, one per open websocket, each tied to the
+    event loop of its connection. ``publish`` can be called from any thread
+    (views, analysis workers) and encodes the event once for all watchers.
+    Another hub (e.g. one backed by a local broker) only has to provide
+    ``subscribe``, ``unsubscribe`` and ``publish``; see CHESS_LIVE_HUB.
+    """
+
+    def __init__(self, queue_size=64):
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, game_id):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(game_id, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, game_id, queue):
+        with self._lock:
+            watchers = self._subscribers.get(game_id, {})
+            watchers.pop(queue, None)
+            if not watchers:
+                self._subscribers.pop(game_id, None)
+
+    def publish(self, game_id, event):
+        with self._lock:
+            watchers = list(self._subscribers.get(game_id, {}).items())
+        if not watchers:
+            return
+        message = json.dumps(event)
+        for queue, loop in watchers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, message)
+            except RuntimeError:
+                # the connection's loop is gone
+                self.unsubscribe(game_id, queue)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(watchers) for watchers in self._subscribers.values())
+
+
+HUB = import_string(config("CHESS_LIVE_HUB", default="chess.live.LocalHub"))()
+METRICS.register("chess_live_watchers", "Open live game websockets.", lambda: len(HUB))
+
+
+def publish_move(game_id, ng, version, ply):
+    entry = ng.moves[-1]
+    flags = entry.split(";;")[2:]
+    HUB.publish(
+        game_id,
+        {
+            "type": "move",
+            "version": version,
+            "ply": ply,
+            "delta": ng.last_move_delta(),
+            "board_hash": ng.board_hash(),
+            "to_move": ng.to_move,
+            "legal_moves": ng.legal_move_map(),
+            "info": entry,
+            "check": "check" in flags or "checkmate" in flags,
+            "checkmate": "checkmate" in flags,
+        },
+    )
+
+
+def publish_analysis(analysis):
+    HUB.publish(
+        analysis.game_id,
+        {
+            "type": "analysis",
+            "ply": analysis.ply,
+            "status": analysis.status,
+            "is_blunder": analysis.is_blunder,
+            "blunder_message": analysis.message,
+        },
+    )
+
+
+async def websocket_application(scope, receive, send):
+    """Raw ASGI websocket endpoint: ``/ws/game/<id>`` streams that game's events."""
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    match = GAME_SOCKET_PATH.match(scope["path"])
+    if match is None or not await sync_to_async(
+        Game.objects.filter(pk=int(match.group(1))).exists
+    )():
+        await send({"type": "websocket.close", "code": CLOSE_NOT_FOUND})
+        return
+    game_id = int(match.group(1))
+
+    await send({"type": "websocket.accept"})
+    queue = HUB.subscribe(game_id)
+    receiver = asyncio.ensure_future(receive())
+    try:
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {receiver, getter}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if getter in done:
+                await send({"type": "websocket.send", "text": getter.result()})
+            else:
+                getter.cancel()
+            if receiver in done:
+                if receiver.result()["type"] == "websocket.disconnect":
+                    break
+                # watchers have nothing to say, anything they send is ignored
+                receiver = asyncio.ensure_future(receive())
+    finally:
+        receiver.cancel()
+        HUB.unsubscribe(game_id, queue)
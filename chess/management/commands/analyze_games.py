@@ -0,0 +1,188 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from chess.ChessLogic.ChessBase import ChessGame
+from chess.ChessLogic.chess_wrapper import BEST_MOVE_RESULT, BlunderDetector, DEFAULT_DEPTH
+from chess.ChessLogic.engine_service import EngineService
+from chess.models import Game, MoveAnalysis
+
+DEFAULT_CHECKPOINT = "analyze_games.checkpoint.json"
+
+
+class Command(BaseCommand):
+    help = "Re-analyse every stored game and save a MoveAnalysis per ply."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1,
+            help="engine processes, 0 analyses in this process",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=20,
+            help="games analysed and written together",
+        )
+        parser.add_argument("--timeout", type=float, default=30.0)
+        parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+        parser.add_argument(
+            "--restart", action="store_true",
+            help="ignore the checkpoint and start from the first game",
+        )
+        parser.add_argument(
+            "--retry-failed", action="store_true",
+            help="only re-analyse games with FAILED plies, the checkpoint is left alone",
+        )
+
+    def handle(self, *args, **options):
+        self.depth = options["depth"]
+        self.timeout = options["timeout"]
+        self.judge = BlunderDetector()
+        self.engine = EngineService(workers=options["workers"], timeout=self.timeout)
+        checkpoint_path = options["checkpoint"]
+
+        state = {"last_game_id": 0, "games": 0, "positions": 0}
+        if options["retry_failed"]:
+            checkpoint_path = None
+            games = Game.objects.filter(analyses__status=MoveAnalysis.FAILED).distinct()
+        else:
+            if not options["restart"] and os.path.exists(checkpoint_path):
+                with open(checkpoint_path) as f:
+                    state.update(json.load(f))
+                self.stdout.write(f"Resuming after game {state['last_game_id']}")
+            games = Game.objects.filter(pk__gt=state["last_game_id"])
+        games = games.order_by("pk")
+        remaining = games.count()
+        started = time.monotonic()
+        done_games = done_positions = 0
+
+        try:
+            batch = []
+            for game in games.only("pk", "board", "moves", "to_move").iterator(
+                chunk_size=options["batch_size"] * 10
+            ):
+                batch.append(game)
+                if len(batch) < options["batch_size"]:
+                    continue
+                done_positions += self.analyze_batch(batch)
+                done_games += len(batch)
+                state["last_game_id"] = batch[-1].pk
+                batch = []
+                self.save_checkpoint(checkpoint_path, state, done_games, done_positions)
+                self.report(started, done_games, done_positions, remaining)
+
+            if batch:
+                done_positions += self.analyze_batch(batch)
+                done_games += len(batch)
+                state["last_game_id"] = batch[-1].pk
+                self.save_checkpoint(checkpoint_path, state, done_games, done_positions)
+                self.report(started, done_games, done_positions, remaining)
+        finally:
+            self.engine.shutdown()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Analysed {done_games} games, {done_positions} positions")
+        )
+
+    def analyze_batch(self, batch):
+        # every position of the batch is queued before any result is read,
+        # so all workers stay busy across game boundaries; each job's timeout
+        # only starts once a worker picks it up
+        jobs = []
+        for game in batch:
+            moves = game.moves.split(",,") if game.moves else []
+            ng = ChessGame(start_string=game.board, moves=moves, to_move=game.to_move)
+            positions = list(ng.iter_positions())
+            fens = [fen for fen, _, _ in positions]
+            played = [
+                ng.translate(move["op"]) + ng.translate(move["np"])
+                for _, _, move in positions[:-1]
+            ]
+            futures = [
+                self.engine.submit(fen, self.depth, self.timeout, fresh=True) for fen in fens
+            ]
+            jobs.append((game, fens, played, futures))
+
+        rows = []
+        positions = failed = 0
+        for game, fens, played, futures in jobs:
+            results = []
+            for future, fen in zip(futures, fens):
+                score, best_move, reached_depth, _ = self.engine.wait(future, fen)
+                # judge_move clamps scores itself and reports mates as such
+                results.append((score, best_move, reached_depth >= self.depth))
+            positions += len(results)
+            for ply in range(1, len(fens)):
+                (eval_before, best_move, complete), (eval_after, _, complete_after) = (
+                    results[ply - 1],
+                    results[ply],
+                )
+                if not (complete and complete_after):
+                    # timed out or failed: --retry-failed picks it up later
+                    rows.append(
+                        MoveAnalysis(
+                            game=game,
+                            ply=ply,
+                            fen_before=fens[ply - 1],
+                            fen_after=fens[ply],
+                            status=MoveAnalysis.FAILED,
+                            is_blunder=False,
+                            message="Move analyzed...",
+                        )
+                    )
+                    failed += 1
+                    continue
+                if played[ply - 1] == best_move:
+                    # every position is searched once at the same depth, so
+                    # the engine's own move can still look like a loss
+                    is_blunder, message = BEST_MOVE_RESULT
+                else:
+                    is_blunder, message = self.judge.judge_move(
+                        fens[ply - 1], eval_before, eval_after, best_move
+                    )
+                rows.append(
+                    MoveAnalysis(
+                        game=game,
+                        ply=ply,
+                        fen_before=fens[ply - 1],
+                        fen_after=fens[ply],
+                        status=MoveAnalysis.DONE,
+                        is_blunder=is_blunder,
+                        message=message,
+                    )
+                )
+
+        MoveAnalysis.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["game", "ply"],
+            update_fields=["fen_before", "fen_after", "status", "is_blunder", "message"],
+        )
+        if failed:
+            self.stderr.write(f"{failed} plies timed out or failed, marked FAILED")
+        return positions
+
+    def save_checkpoint(self, path, state, done_games, done_positions):
+        if path is None:
+            return
+        data = dict(state)
+        data["games"] = state["games"] + done_games
+        data["positions"] = state["positions"] + done_positions
+        # write then rename so a kill mid-write never leaves a broken checkpoint
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    def report(self, started, done_games, done_positions, remaining):
+        elapsed = time.monotonic() - started
+        rate = done_positions / elapsed if elapsed else 0.0
+        games_rate = done_games / elapsed if elapsed else 0.0
+        left = remaining - done_games
+        eta = left / games_rate if games_rate else 0.0
+        self.stdout.write(
+            f"{done_games}/{remaining} games, {rate:.1f} positions/s, "
+            f"ETA {int(eta // 3600)}h{int(eta % 3600 // 60):02d}m{int(eta % 60):02d}s"
+        )
@@ -0,0 +1,58 @@
+import gzip
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from chess.ChessLogic.ChessBase import read_pgn
+from chess.ChessLogic.bitboard import BitBoard, STARTING_FEN
+from chess.ChessLogic.opening_book import (
+    DEFAULT_BOOK_PATH,
+    book_key,
+    reset_opening_book,
+    write_book,
+)
+
+
+class Command(BaseCommand):
+    help = "Build the opening book file from the first plies of PGN games."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+")
+        parser.add_argument("--output", "-o", default=DEFAULT_BOOK_PATH)
+        parser.add_argument("--plies", type=int, default=16)
+        parser.add_argument(
+            "--min-count", type=int, default=2,
+            help="drop moves played fewer times than this",
+        )
+
+    def handle(self, *args, **options):
+        counts = Counter()
+        games = skipped = 0
+        started = time.monotonic()
+        for path in options["paths"]:
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+                for pgn_game in read_pgn(f):
+                    if pgn_game["headers"].get("FEN", STARTING_FEN) != STARTING_FEN:
+                        continue
+                    board = BitBoard()
+                    try:
+                        for san in pgn_game["moves"][: options["plies"]]:
+                            move = board.parse_san(san)
+                            counts[(book_key(board), move)] += 1
+                            board.push(move)
+                    except ValueError:
+                        skipped += 1
+                    games += 1
+
+        counts = {k: v for k, v in counts.items() if v >= options["min_count"]}
+        write_book(options["output"], counts)
+        reset_opening_book()
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {len(counts)} book moves from {games} games "
+                f"({skipped} with illegal moves) to {options['output']} in {elapsed:.1f}s"
+            )
+        )
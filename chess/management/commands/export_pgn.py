@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chess.export import filter_games, iter_pgn, parse_day
+
+
+class Command(BaseCommand):
+    help = "Stream stored games as PGN to a file or stdout."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ids", default="", help="comma separated game ids")
+        parser.add_argument("--since", default=None, help="YYYY-MM-DD")
+        parser.add_argument("--until", default=None, help="YYYY-MM-DD")
+        parser.add_argument(
+            "--fen", action="store_true", help="add the FEN after every move"
+        )
+        parser.add_argument("--output", "-o", default="-")
+
+    def handle(self, *args, **options):
+        try:
+            ids = [int(x) for x in options["ids"].split(",") if x.strip()]
+        except ValueError:
+            raise CommandError(f"Invalid --ids {options['ids']!r}, expected comma separated ids")
+        try:
+            since = parse_day(options["since"])
+            until = parse_day(options["until"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        games = filter_games(ids=ids, since=since, until=until)
+        out = sys.stdout if options["output"] == "-" else open(options["output"], "w")
+        count = 0
+        try:
+            for pgn in iter_pgn(games, fens=options["fen"]):
+                out.write(pgn)
+                count += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        self.stderr.write(f"Exported {count} games")
@@ -0,0 +1,84 @@
+import gzip
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from chess.ChessLogic.ChessBase import ChessGame, read_pgn
+from chess.models import Game
+
+
+def game_info(headers):
+    info = f"{headers.get('White', '?')} vs {headers.get('Black', '?')}"
+    if headers.get("Result"):
+        info += f" ({headers['Result']})"
+    if headers.get("Event"):
+        info += f", {headers['Event']}"
+    if headers.get("Date"):
+        info += f" {headers['Date']}"
+    return info[:255]
+
+
+class Command(BaseCommand):
+    help = "Import every game of a PGN file (plain or .gz) as Game rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="games inserted per transaction",
+        )
+        parser.add_argument("--limit", type=int, default=None)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        opener = gzip.open if path.endswith(".gz") else open
+        batch_size = options["batch_size"]
+
+        started = time.monotonic()
+        imported = skipped = plies = 0
+        batch = []
+        with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+            for pgn_game in read_pgn(f):
+                if options["limit"] is not None and imported + len(batch) >= options["limit"]:
+                    break
+                try:
+                    ng = ChessGame.from_san(pgn_game["moves"], pgn_game["headers"].get("FEN"))
+                except ValueError as e:
+                    skipped += 1
+                    self.stderr.write(f"Skipping game {imported + len(batch) + skipped}: {e}")
+                    continue
+                plies += len(ng.moves)
+                batch.append(
+                    Game(
+                        board=ng.str_board(),
+                        moves=",,".join(ng.moves),
+                        to_move=ng.to_move,
+                        info=game_info(pgn_game["headers"]),
+                        result=pgn_game["result"],
+                    )
+                )
+                if len(batch) >= batch_size:
+                    imported += self.flush(batch)
+                    batch = []
+                    self.report(started, imported, skipped, plies)
+            if batch:
+                imported += self.flush(batch)
+                self.report(started, imported, skipped, plies)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Imported {imported} games ({plies} plies), skipped {skipped}")
+        )
+
+    def flush(self, batch):
+        with transaction.atomic():
+            Game.objects.bulk_create(batch, batch_size=len(batch))
+        return len(batch)
+
+    def report(self, started, imported, skipped, plies):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"{imported} games, {skipped} skipped, "
+            f"{imported / elapsed if elapsed else 0.0:.1f} games/s, "
+            f"{plies / elapsed if elapsed else 0.0:.0f} plies/s"
+        )
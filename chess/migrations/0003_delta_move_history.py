@@ -0,0 +1,105 @@
+# Rewrites Game.moves from "board;;op;;np;;info" entries (a full board
+# snapshot per ply) to "op;;np;;info" deltas with a board checkpoint every
+# CHECKPOINT_INTERVAL plies, matching ChessGame.checkpoint_interval.
+
+from django.db import migrations
+
+CHECKPOINT_INTERVAL = 16
+BATCH_SIZE = 500
+
+
+def parse_board(board):
+    for i in "123456789":
+        board = board.replace(i, "-" * int(i))
+    return [list(row) for row in board.replace("\n", "/").split("/")][::-1]
+
+
+def placement(board):
+    rows = []
+    for row in board[::-1]:
+        text = "".join(row)
+        for i in range(8, 0, -1):
+            text = text.replace("-" * i, str(i))
+        rows.append(text)
+    return "/".join(rows)
+
+
+def str_board(board):
+    return "\n".join("".join(row) for row in board[::-1])
+
+
+def square(name):
+    return int(name[1]) - 1, "abcdefgh".index(name[0])
+
+
+def to_delta(moves):
+    entries = []
+    for i, entry in enumerate(moves.split(",,")):
+        old_board, op, np, *info = entry.split(";;")
+        board = parse_board(old_board)
+        extra = []
+        if i % CHECKPOINT_INTERVAL == 0:
+            extra.append("board-" + placement(board))
+        r, c = square(np)
+        if board[r][c] != "-":
+            extra.append("capture-" + board[r][c])
+        entries.append(";;".join([op, np, *extra, *info]))
+    return ",,".join(entries)
+
+
+def to_snapshots(moves):
+    entries = []
+    board = None
+    for entry in moves.split(",,"):
+        op, np, *tokens = entry.split(";;")
+        info = []
+        for x in tokens:
+            if x.startswith("board-"):
+                board = parse_board(x[6:])
+            elif not x.startswith("capture-"):
+                info.append(x)
+        entries.append(";;".join([str_board(board), op, np, *info]))
+
+        (r0, c0), (r1, c1) = square(op), square(np)
+        piece = board[r0][c0]
+        for x in info:
+            if x.startswith("promote-"):
+                piece = x[8:].upper() if piece == "P" else x[8:].lower()
+            elif x.startswith("enpass-"):
+                r, c = square(x[7:])
+                board[r][c] = "-"
+        board[r1][c1] = piece
+        board[r0][c0] = "-"
+    return ",,".join(entries)
+
+
+def convert(apps, convert_moves):
+    Game = apps.get_model("chess", "Game")
+    batch = []
+    for game in Game.objects.exclude(moves=None).exclude(moves="").iterator():
+        game.moves = convert_moves(game.moves)
+        batch.append(game)
+        if len(batch) >= BATCH_SIZE:
+            Game.objects.bulk_update(batch, ["moves"])
+            batch = []
+    if batch:
+        Game.objects.bulk_update(batch, ["moves"])
+
+
+def forwards(apps, schema_editor):
+    convert(apps, to_delta)
+
+
+def backwards(apps, schema_editor):
+    convert(apps, to_snapshots)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chess", "0002_boardpuzzle_gamepuzzle_game_info_game_moves_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
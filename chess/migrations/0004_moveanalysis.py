@@ -0,0 +1,30 @@
+# Generated by Django 4.2.20 on 2026-10-18 05:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0003_delta_move_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoveAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ply', models.PositiveIntegerField()),
+                ('fen_before', models.CharField(max_length=100)),
+                ('fen_after', models.CharField(max_length=100)),
+                ('status', models.CharField(default='pending', max_length=10)),
+                ('is_blunder', models.BooleanField(default=False)),
+                ('message', models.TextField(blank=True, null=True)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analyses', to='chess.game')),
+            ],
+            options={
+                'unique_together': {('game', 'ply')},
+            },
+        ),
+    ]
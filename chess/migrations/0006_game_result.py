@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 06:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0005_game_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='result',
+            field=models.CharField(default='*', max_length=7),
+        ),
+    ]
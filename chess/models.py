@@ -7,6 +7,10 @@ class Game(models.Model):
     moves = models.TextField(null=True, blank=True)
     info = models.TextField(max_length=255, default="info")
     to_move = models.CharField(max_length=5, default="white")
+    # bumped on every move so cached copies of the game can tell they are stale
+    version = models.PositiveIntegerField(default=0)
+    # PGN result of an imported game, "*" while a game is unfinished
+    result = models.CharField(max_length=7, default="*")
 
 
 class BoardPuzzle(models.Model):
@@ -21,3 +25,20 @@ class GamePuzzle(models.Model):
     solution = models.TextField()
     info = models.TextField()
     to_move = models.CharField(max_length=5, default="white")
+
+
+class MoveAnalysis(models.Model):
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name="analyses")
+    ply = models.PositiveIntegerField()
+    fen_before = models.CharField(max_length=100)
+    fen_after = models.CharField(max_length=100)
+    status = models.CharField(max_length=10, default=PENDING)
+    is_blunder = models.BooleanField(default=False)
+    message = models.TextField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("game", "ply")
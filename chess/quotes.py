@@ -0,0 +1,122 @@
+import random
+import threading
+import time
+from collections import deque
+
+import openai
+from decouple import config
+from django.utils.module_loading import import_string
+
+from .ChessLogic.metrics import METRICS
+
+openai.api_key = config("OPENAI_API_KEY")
+
+FALLBACK_QUOTES = [
+    "When you see a good move, look for a better one. – Emanuel Lasker",
+    "Chess is the gymnasium of the mind. – Blaise Pascal",
+]
+
+
+def openai_quote():
+    response = openai.ChatCompletion.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You're a chess master and philosopher."},
+            {"role": "user", "content": "Give me a motivational chess quote."},
+        ],
+        max_tokens=60,
+        temperature=0.8,
+    )
+    return response.choices[0].message["content"].strip()
+
+
+class QuotePool:
+    """Quotes fetched ahead of time, so a page never waits for the API.
+
+    ``take`` is O(1) and never blocks: it cycles through the pooled quotes,
+    or returns a fallback while the pool is empty, and wakes a background
+    thread to top the pool up. Quotes expire after ``ttl`` seconds. ``fetch``
+    is any callable returning one quote; tests can pass a stub and call
+    ``refill`` directly.
+    """
+
+    def __init__(self, fetch, size=8, ttl=3600, retry=60, fallback=FALLBACK_QUOTES):
+        self.fetch = fetch
+        self.size = size
+        self.ttl = ttl
+        self.retry = retry
+        self.fallback = fallback
+        self.fetch_errors = 0
+        # (expires_at, quote), refilled at the back
+        self._quotes = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _prune(self, now):
+        # only the front is checked: entries further back are dropped when
+        # they rotate to it
+        while self._quotes and self._quotes[0][0] <= now:
+            self._quotes.popleft()
+
+    def take(self):
+        with self._lock:
+            self._prune(time.monotonic())
+            quote = None
+            if self._quotes:
+                entry = self._quotes.popleft()
+                self._quotes.append(entry)
+                quote = entry[1]
+            if len(self._quotes) < self.size:
+                self._wake.set()
+                self._start()
+        return quote if quote is not None else random.choice(self.fallback)
+
+    def refill(self):
+        """Fetch quotes until the pool is full; False if the client failed."""
+        # at most one pool's worth per pass, even if quotes expire as fast
+        # as they are fetched
+        for _ in range(self.size):
+            with self._lock:
+                self._prune(time.monotonic())
+                if len(self._quotes) >= self.size:
+                    return True
+            try:
+                quote = self.fetch()
+            except Exception as e:
+                print("Quote fetch error:", e)
+                self.fetch_errors += 1
+                return False
+            if not quote:
+                return False
+            with self._lock:
+                self._quotes.append((time.monotonic() + self.ttl, quote))
+        return True
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="chess-quotes", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            # also wakes up on its own to replace quotes as they expire
+            self._wake.wait(timeout=self.ttl)
+            self._wake.clear()
+            if not self.refill():
+                # offline or rate limited, don't ask again on every page view
+                time.sleep(self.retry)
+
+    def __len__(self):
+        return len(self._quotes)
+
+
+QUOTE_POOL = QuotePool(
+    import_string(config("CHESS_QUOTE_CLIENT", default="chess.quotes.openai_quote")),
+    size=config("CHESS_QUOTE_POOL_SIZE", default=8, cast=int),
+    ttl=config("CHESS_QUOTE_TTL", default=3600, cast=int),
+)
+METRICS.register("chess_quote_pool_quotes", "Quotes ready for the home page.", lambda: len(QUOTE_POOL))
+METRICS.register(
+    "chess_quote_fetch_errors_total", "Failed quote fetches.", lambda: QUOTE_POOL.fetch_errors, "counter"
+)
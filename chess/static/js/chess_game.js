@@ -2,6 +2,8 @@ import * as hl from "./helper_functions.js";
 
 var csrftoken;
 var flip_board_button, game_info, game_board, extra_info, to_move;
+var POLL_INTERVAL_MS = 500, POLL_MAX_TRIES = 60;
+var live_socket = null, LIVE_RETRY_MS = 2000;
 var pdict = { '-': 'empty', 'p':  'pawn', 'r':  'rook', 'n': 'knight', 'b': 'bishop', 'q': 'queen', 'k': 'king' };
 
 function lower(s)       { return s.toLowerCase(); }
@@ -12,8 +14,12 @@ function piece_url(p)   { return chess_url_image_base + gcolor(p) + '_' + pdict[
 function set_info() {
     game_board  = parse_str_board(game_info["board"]);
     to_move     = game_info["to_move"];
-    extra_info  = game_info["info"].split(";;").slice(3);
     populate_board(game_board, to_move);
+    set_status();
+}
+
+function set_status() {
+    extra_info  = game_info["info"].split(";;").slice(2);
 
     let game_stat = document.getElementById("game-status");
     if (extra_info.includes("checkmate")) {
@@ -31,28 +37,69 @@ function parse_str_board(str_board) {
     return str_board.split("\n").reverse();
 }
 
-function handle_piece(piece, addt=true) {
-    piece.removeEventListener("click", second_click);
-    piece.removeEventListener("click", handle_click);
-    if (addt) {
-        piece.classList.add("to-move-piece");
-        piece.addEventListener("click", handle_click);
-    } else {
-        piece.classList.remove("to-move-piece");
+function board_hash(str_board) {
+    // FNV-1a, same as fnv1a_32() in ChessBase.py
+    let h = 0x811c9dc5;
+    for (let i = 0; i < str_board.length; i++) {
+        h = Math.imul(h ^ str_board.charCodeAt(i), 0x01000193);
+    }
+    return h >>> 0;
+}
+
+function set_square(i, j, p) {
+    get_square(i+1, j+1).innerHTML = '<img class="chess-piece-image" src="' + piece_url(p) + '">';
+}
+
+function mark_to_move(ll, to_move = false) {
+    for (let i = 0; i < 8; i++) {
+        for (let j = 0; j < 8; j++) {
+            get_square(i+1, j+1).classList.toggle("to-move-piece", Boolean(to_move) && gcolor(ll[i][j]) == to_move);
+        }
     }
 }
 
 function populate_board(ll, to_move = false) {
     for (let i = 0; i < 8; i++) {
         for (let j = 0; j < 8; j++) {
-            if (to_move && gcolor(ll[i][j]) == to_move) {
-                handle_piece(get_square(i+1, j+1));
-            } else {
-                handle_piece(get_square(i+1, j+1), false);
-            }
-            get_square(i+1, j+1).innerHTML = '<img class="chess-piece-image" src="' + piece_url( ll[i][j] ) + '">';
+            set_square(i, j, ll[i][j]);
         }
     }
+    mark_to_move(ll, to_move);
+}
+
+// patches only the squares a move changed, a full sync is fetched when the
+// result does not hash to what the server has
+function apply_delta(data) {
+    let rows = game_board.map(row => row.split(""));
+    for (const [i, j, p] of data["delta"]) {
+        rows[i][j] = p;
+        set_square(i, j, p);
+    }
+    game_board           = rows.map(row => row.join(""));
+    game_info["board"]   = game_board.slice().reverse().join("\n");
+    game_info["to_move"] = to_move = data["to_move"];
+    game_info["info"]    = data["info"];
+    game_info["version"] = data["version"];
+    game_info["legal_moves"] = data["legal_moves"];
+    mark_to_move(game_board, to_move);
+    set_status();
+
+    if (board_hash(game_info["board"]) != data["board_hash"]) {
+        full_sync();
+    }
+}
+
+function full_sync() {
+    fetch(window.location.pathname, {
+        headers: { "Accept": "application/json" },
+        credentials: "same-origin",
+    })
+    .then(response => response.json())
+    .then(data => {
+        game_info = data;
+        set_info();
+    })
+    .catch(hl.log_error);
 }
 
 function translate(y, x = null) {
@@ -89,58 +136,128 @@ function show_blunder_message(message) {
     }
 }
 
+function poll_analysis(ply, tries = 0) {
+    fetch(window.location.pathname + "/analysis/" + ply, {
+        headers: { "Accept": "application/json" },
+        credentials: "same-origin",
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data["status"] == "pending") {
+            if (tries < POLL_MAX_TRIES) {
+                setTimeout(() => poll_analysis(ply, tries + 1), POLL_INTERVAL_MS);
+            }
+        } else if (data["blunder_message"]) {
+            show_blunder_message(data["blunder_message"]);
+        }
+    })
+    .catch(hl.log_error);
+}
+
+function live_open() {
+    return live_socket != null && live_socket.readyState == WebSocket.OPEN;
+}
+
+function apply_live_move(data) {
+    if (data["version"] <= game_info["version"]) {
+        return;     // our own move, already shown from the POST response
+    }
+    clear_selection();
+    if (data["version"] != game_info["version"] + 1) {
+        full_sync();    // missed an update
+        return;
+    }
+    apply_delta(data);
+}
+
+function connect_live() {
+    let scheme = window.location.protocol == "https:" ? "wss://" : "ws://";
+    live_socket = new WebSocket(scheme + window.location.host + "/ws" + window.location.pathname);
+    live_socket.onmessage = (event) => {
+        let data = JSON.parse(event.data);
+        if (data["type"] == "move") {
+            apply_live_move(data);
+        } else if (data["type"] == "analysis" && data["blunder_message"]) {
+            show_blunder_message(data["blunder_message"]);
+        }
+    };
+    // plain WSGI servers have no websockets, polling still works there
+    live_socket.onclose = (event) => {
+        if (event.code != 4404 && event.wasClean) {
+            setTimeout(connect_live, LIVE_RETRY_MS);
+        }
+    };
+}
+
 function success_move(response) {
-    hl.rem_all("highlighted-piece-main");
+    clear_selection();
     response.json().then(data => {
         if (data["result"] == "valid move") {
+            apply_delta(data);
+
+            // blunder analysis finishes after the move, ask for it separately
+            if (data["ply"] && !live_open()) {
+                poll_analysis(data["ply"]);
+            }
+        } else if (data["result"] == "conflict") {
+            // the game moved on elsewhere (another tab), show the stored board
             game_info = data;
             set_info();
-            
-            // Show blunder message if present
-            if (data["blunder_message"]) {
-                show_blunder_message(data["blunder_message"]);
-            }
+            alert("This game was updated elsewhere, the board has been reloaded.");
         } else {
             alert("invalid move");
         }
     });
 }
 
-function second_click(event) {
+function second_click(piece_second) {
     let piece_main = document.getElementsByClassName("highlighted-piece-main")[0];
-    let piece_second = event.target;
 
-    let data_body = {"op": get_from_el(piece_main), "np": get_from_el(piece_second)}
+    let data_body = {"op": get_from_el(piece_main), "np": get_from_el(piece_second), "version": game_info["version"]}
     hl.post_request("", csrftoken, data_body, success_move);
 }
 
-function highlight_add(piece) {
-    for (let i = 0; i < 8; i++) {
-        for (let j = 0; j < 8; j++) {
-            if (game_board[i][j] == '-' || gcolor(game_board[i][j]) != to_move) {
-                get_square(i+1, j+1).addEventListener("click", second_click);
-            }
-        }
+function destinations(piece) {
+    let [i, j] = get_from_el(piece);
+    return game_info["legal_moves"][i + "" + j] || [];
+}
+
+function clear_selection() {
+    hl.rem_all("highlighted-piece-main");
+    for (const marker of Array.from(document.getElementsByClassName("valid-moves"))) {
+        marker.remove();
     }
-    return piece;
 }
 
-function handle_click(event) {
-    let piece = event.target;
+function handle_click(piece) {
     hl.rem_all('highlighted-piece-secondary');
-    if (piece.classList.contains("to-move-piece")) {
-        let z = piece.classList.contains("highlighted-piece-main");
-        hl.rem_all('highlighted-piece-main');
-        if (!z) {
-            piece.classList.add("highlighted-piece-main");
-            highlight_add(piece);
-        } else {
-            hl.rem_all("valid-moves");
+    let z = piece.classList.contains("highlighted-piece-main");
+    clear_selection();
+    if (!z) {
+        piece.classList.add("highlighted-piece-main");
+        for (const [i, j] of destinations(piece)) {
+            get_square(i+1, j+1).insertAdjacentHTML("beforeend", '<div class="valid-moves"></div>');
         }
     }
-    else {
-        if (document.getElementsByClassName("highlighted-piece-main").length >= 1) {
-            piece.classList.add("highlighted-piece-secondary");
+}
+
+// one listener on the board instead of one per square, so redrawing a
+// square never has to re-bind anything
+function board_click(event) {
+    let square = event.target.closest(".chess-board-cell");
+    if (square == null) {
+        return;
+    }
+    let piece_main = document.getElementsByClassName("highlighted-piece-main")[0];
+    if (square.classList.contains("to-move-piece")) {
+        handle_click(square);
+    } else if (piece_main) {
+        let [i, j] = get_from_el(square);
+        // illegal targets never reach the server
+        if (destinations(piece_main).some(([y, x]) => y == i && x == j)) {
+            second_click(square);
+        } else {
+            clear_selection();
         }
     }
 }
@@ -157,6 +274,9 @@ document.addEventListener('DOMContentLoaded', function() {
     flip_board_button   = document.getElementById("flip-board");
     game_info           = JSON.parse(document.getElementById("game-get-info").textContent);
     set_info();
+    connect_live();
+
+    document.getElementById("chess-board-table-body").addEventListener("click", board_click);
 
     flip_board_button.addEventListener("click", (event) => {
         flip_table();
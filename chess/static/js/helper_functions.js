@@ -64,4 +64,4 @@ function post_request_fetch(url, send_data, csrf) {
 }
 */
 
-export { post_request, rem_all } ;
+export { post_request, rem_all, log_error } ;
@@ -0,0 +1,97 @@
+from django.test import SimpleTestCase
+
+from .ChessLogic.bitboard import BitBoard
+from .ChessLogic.blunder_detection import ChessBlunderDetector
+from .ChessLogic.chess_wrapper import ANALYSIS_UNAVAILABLE
+from .ChessLogic.engine_service import EngineService
+from .ChessLogic.eval_cache import EvalCache
+from .quotes import FALLBACK_QUOTES, QuotePool
+
+# 1. e4 e5 2. Nf3 Nc6 3. Bc4 Nf6 4. Ng5 d5 5. exd5 Nxd5
+FEN_BEFORE = "r1bqkb1r/ppp2ppp/2n5/3np1N1/2B5/8/PPPP1PPP/RNBQK2R w KQkq - 0 6"
+
+
+class QuotePoolTests(SimpleTestCase):
+    def stub(self):
+        self.calls += 1
+        return f"Stub quote {self.calls}"
+
+    def setUp(self):
+        self.calls = 0
+
+    def test_refill_fills_to_size_and_take_cycles(self):
+        pool = QuotePool(self.stub, size=3)
+        self.assertTrue(pool.refill())
+        self.assertEqual(len(pool), 3)
+        self.assertEqual(
+            [pool.take() for _ in range(4)],
+            ["Stub quote 1", "Stub quote 2", "Stub quote 3", "Stub quote 1"],
+        )
+        self.assertEqual(self.calls, 3)
+
+    def test_expired_quotes_are_dropped(self):
+        pool = QuotePool(self.stub, size=2, ttl=0)
+        pool.refill()
+        self.assertEqual(self.calls, 2)
+        pool._start = lambda: None
+        self.assertIn(pool.take(), FALLBACK_QUOTES)
+        self.assertEqual(len(pool), 0)
+
+    def test_empty_pool_falls_back_without_fetching(self):
+        pool = QuotePool(self.stub, size=2)
+        # keep the background refill out of the test
+        pool._start = lambda: None
+        self.assertIn(pool.take(), FALLBACK_QUOTES)
+        self.assertEqual(self.calls, 0)
+
+    def test_failed_fetch_is_counted(self):
+        def offline():
+            raise OSError("offline")
+
+        pool = QuotePool(offline, size=2)
+        self.assertFalse(pool.refill())
+        self.assertEqual(pool.fetch_errors, 1)
+        self.assertEqual(len(pool), 0)
+
+
+class EvalCacheTests(SimpleTestCase):
+    def setUp(self):
+        board = BitBoard(FEN_BEFORE)
+        board.push(board.parse_san("Nxf7"))
+        self.fen_after = board.fen
+        # no deadline, so a search only depends on the position and depth
+        self.engine = EngineService(workers=0, timeout=0)
+
+    def detector(self, cache):
+        return ChessBlunderDetector(cache=cache, engine=self.engine, book=False)
+
+    def test_entries_only_answer_their_own_depth(self):
+        cache = EvalCache()
+        cache.put(FEN_BEFORE, 40, "d1f3", 3)
+        self.assertIsNone(cache.get(FEN_BEFORE, 2))
+        self.assertEqual(cache.get(FEN_BEFORE, 3), (40, "d1f3", 3))
+
+    def test_warm_cache_gives_the_cold_verdict(self):
+        cold = self.detector(EvalCache()).detect_blunder(FEN_BEFORE, self.fen_after, 2)
+
+        warm = self.detector(EvalCache())
+        # deeper results for both positions, as other requests would leave them
+        warm.analyze_many([(FEN_BEFORE, 3), (self.fen_after, 3)])
+        self.assertEqual(warm.detect_blunder(FEN_BEFORE, self.fen_after, 2), cold)
+        self.assertEqual(warm.cache.hits, 0)
+        self.assertEqual(warm.detect_blunder(FEN_BEFORE, self.fen_after, 2), cold)
+        self.assertEqual(warm.cache.hits, 2)
+
+    def test_timed_out_search_is_not_judged_or_cached(self):
+        class TimedOut:
+            def submit(self, fen, depth, fresh=False):
+                return None
+
+            def wait(self, future, fen):
+                return 0.0, None, 0, True
+
+        detector = ChessBlunderDetector(cache=EvalCache(), engine=TimedOut(), book=False)
+        self.assertEqual(
+            detector.detect_blunder(FEN_BEFORE, self.fen_after, 2), ANALYSIS_UNAVAILABLE
+        )
+        self.assertEqual(len(detector.cache), 0)
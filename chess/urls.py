@@ -1,9 +1,33 @@
+from django.conf import settings
 from django.urls import path
 
-from .views import chess_game, chess_home, chess_news
+from .views import (
+    chess_game,
+    chess_home,
+    chess_news,
+    export_games,
+    game_report,
+    metrics,
+    move_analysis,
+    timing_stats,
+)
 
 urlpatterns = [
     path("", chess_home, name="chess_home"),
     path("game/<int:game_id>", chess_game, name="chess_game"),
+    path(
+        "game/<int:game_id>/analysis/<int:ply>",
+        move_analysis,
+        name="move_analysis",
+    ),
+    path("game/<int:game_id>/report", game_report, name="game_report"),
+    path("game/<int:game_id>/export", export_games, name="export_game"),
+    path("export/", export_games, name="export_games"),
     path("news/", chess_news, name="chess_news"),
+    path("metrics", metrics, name="metrics"),
 ]
+
+if settings.DEBUG:
+    urlpatterns += [
+        path("debug/timings", timing_stats, name="timing_stats"),
+    ]
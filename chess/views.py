@@ -1,36 +1,26 @@
 import json
-import openai
-import random
-from django.http import JsonResponse
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from django.conf import settings
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
-from .ChessLogic.ChessBase import ChessGame
-from .models import Game
+from .ChessLogic.metrics import METRICS
+from .ChessLogic.timing import NULL_TIMER, PHASE_HISTOGRAM, RequestTimer
+from .models import Game, MoveAnalysis
+from .analysis import queue_analysis, queue_report
+from .game_cache import GAME_CACHE, load_game
+from .live import publish_move
+from .quotes import QUOTE_POOL
+from .export import filter_games, iter_pgn, parse_day
 from .ChessLogic.chess_news_scraper import get_all_news
 import traceback
-from decouple import config
-
-openai.api_key=config("OPENAI_API_KEY")
-
-def get_chess_quote():
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You're a chess master and philosopher."},
-                {"role": "user", "content": "Give me a motivational chess quote."}
-            ],
-            max_tokens=60,
-            temperature=0.8
-        )
-        return response.choices[0].message['content'].strip()
-    except Exception as e:
-        print("OpenAI error:", e)
-        fallback_quotes = [
-            "When you see a good move, look for a better one. – Emanuel Lasker",
-            "Chess is the gymnasium of the mind. – Blaise Pascal",
-        ]
-        return random.choice(fallback_quotes)
-
 
 
 def chess_home(request):
@@ -38,66 +28,228 @@ def chess_home(request):
         game = Game.objects.create()
         return redirect("chess_game", game_id=game.pk)
     else:
-        quote = get_chess_quote()
+        quote = QUOTE_POOL.take()
         games = Game.objects.all()
         return render(request, "chess_home.html", {
             "games": [x.id for x in games],
             "quote": quote
         })
 
+def parse_move(body, version):
+    """(op, np, version seen by the client) from a move POST; ValueError if malformed."""
+    try:
+        rec_data = json.loads(body)
+        op = (int(rec_data["op"][0]), int(rec_data["op"][1]))
+        np = (int(rec_data["np"][0]), int(rec_data["np"][1]))
+    except (ValueError, TypeError, KeyError, IndexError):
+        raise ValueError("Expected a JSON body with op and np squares")
+    seen = rec_data.get("version", version)
+    if not isinstance(seen, int) or isinstance(seen, bool):
+        raise ValueError("version must be an integer")
+    return op, np, seen
+
+
+def game_conflict(game_id, timer):
+    """409 carrying the stored state of the game, so the client can resync."""
+    live = load_game(game_id, timer)
+    if live is None:
+        raise Http404("No Game matches the given query.")
+    version, ng, info = live
+    GAME_CACHE.put(game_id, version, ng, info)
+    response = JsonResponse(
+        {
+            "result": "conflict",
+            "board": ng.str_board(),
+            "to_move": ng.to_move,
+            "info": ng.moves[-1] if ng.moves else "",
+            "version": version,
+            "legal_moves": ng.legal_move_map(),
+        },
+        status=409,
+    )
+    response["Server-Timing"] = timer.server_timing()
+    timer.record()
+    return response
+
+
 def chess_game(request, game_id):
-    game = get_object_or_404(Game, pk=game_id)
-    gmoves = game.moves.split(",,") if game.moves and len(game.moves) > 0 else []
-    ng = ChessGame(start_string=game.board, moves=gmoves, to_move=game.to_move)
+    timer = RequestTimer()
+    live = load_game(game_id, timer)
+    if live is None:
+        raise Http404("No Game matches the given query.")
+    version, ng, info = live
+    ng.timer = timer
 
-    if request.method == "POST":
-        rec_data = json.loads(request.body)
-        if "op" not in rec_data or "np" not in rec_data:
-            return False
-
-        resg = ng.move(
-            (int(rec_data["op"][0]), int(rec_data["op"][1])),
-            np=(int(rec_data["np"][0]), int(rec_data["np"][1])),
-        )
-        if resg:
-            game.board = ng.str_board()
-            game.moves = ",,".join(ng.moves)
-            game.to_move = ng.to_move
-            game.save()
-            result = "valid move"
-
-            # Get blunder message if any
-            blunder_message = ng.get_last_blunder_message()
+    try:
+        if request.method == "POST":
+            try:
+                op, np, seen = parse_move(request.body, version)
+            except ValueError as e:
+                # nothing was touched, the live game can go straight back
+                ng.timer = NULL_TIMER
+                GAME_CACHE.put(game_id, version, ng, info)
+                return HttpResponseBadRequest(str(e))
+            # a client that sends the version it was shown moves on that board only
+            if seen != version:
+                ng.timer = NULL_TIMER
+                GAME_CACHE.put(game_id, version, ng, info)
+                return game_conflict(game_id, timer)
+            with timer.span("validate"):
+                # the map is needed for the response anyway and is cached with the game
+                valid = list(np) in ng.legal_move_map().get(f"{op[0]}{op[1]}", [])
+            # internal_move times its own check detection
+            resg = valid and ng.internal_move(op, np, analyze=False)
+            if resg:
+                entry = ng.moves[-1]
+                with transaction.atomic():
+                    with timer.span("save"):
+                        # compare-and-swap on the version: no row lock is taken
+                        # while the move is validated, and only the new history
+                        # entry is sent, appended in SQL
+                        saved = Game.objects.filter(pk=game_id, version=version).update(
+                            board=ng.str_board(),
+                            moves=Concat(F("moves"), Value(",," + entry))
+                            if len(ng.moves) > 1
+                            else Value(entry),
+                            to_move=ng.to_move,
+                            version=F("version") + 1,
+                        )
+                    if saved:
+                        # blunder check runs in the background, the client polls for it
+                        with timer.span("blunder"):
+                            ply = len(ng.moves)
+                            queue_analysis(game_id, ply, *ng.last_positions)
+                        transaction.on_commit(
+                            lambda v=version + 1, p=ply: publish_move(game_id, ng, v, p)
+                        )
+                if not saved:
+                    # another request moved first, this ChessGame is now stale
+                    return game_conflict(game_id, timer)
+                version += 1
+                result = "valid move"
+            else:
+                result = "invalid move"
+                ply = None
+
+            # the report catches up in the background, this is what it has so far
+            with timer.span("report"):
+                report = queue_report(game_id, ng)
+            with timer.span("serialize"):
+                # only the squares that changed, the client patches its board
+                response = JsonResponse(
+                    {
+                        "result": result,
+                        "delta": ng.last_move_delta() if resg else [],
+                        "board_hash": ng.board_hash(),
+                        "to_move": ng.to_move,
+                        "info": ng.moves[-1] if ng.moves else "",
+                        "version": version,
+                        "legal_moves": ng.legal_move_map(),
+                        "report": report,
+                        "ply": ply,
+                    }
+                )
+        elif request.headers.get("Accept") == "application/json":
+            # full state, for a client whose patched board went out of sync
+            with timer.span("serialize"):
+                response = JsonResponse(
+                    {
+                        "board": ng.str_board(),
+                        "to_move": ng.to_move,
+                        "info": ng.moves[-1] if ng.moves else "",
+                        "version": version,
+                        "legal_moves": ng.legal_move_map(),
+                    }
+                )
         else:
-            result = "invalid move"
-            blunder_message = None
-
-        report = ng.analyze_moves()
-        return JsonResponse(
-            {
-                "result": result,
-                "board": game.board,
-                "to_move": game.to_move,
-                "info": ng.moves[-1],
-                "report": report,
-                "blunder_message": blunder_message,
-            }
-        )
+            with timer.span("render"):
+                response = render(
+                    request,
+                    "chess_game.html",
+                    {
+                        "chess_id": game_id,
+                        "game": {
+                            "info": info,
+                            "moves": ng.moves,
+                            "board": ng.str_board(),
+                            "to_move": ng.to_move,
+                            "info": ng.moves[-1] if len(ng.moves) >= 1 else "",
+                            "version": version,
+                            "legal_moves": ng.legal_move_map(),
+                        },
+                    },
+                )
+    except Exception:
+        # the live game may be half way through a move, rebuild it next time
+        GAME_CACHE.discard(game_id)
+        raise
+    ng.timer = NULL_TIMER
+    GAME_CACHE.put(game_id, version, ng, info)
+    response["Server-Timing"] = timer.server_timing()
+    timer.record()
+    return response
+
+
+def game_report(request, game_id):
+    live = load_game(game_id)
+    if live is None:
+        raise Http404("No Game matches the given query.")
+    version, ng, info = live
+    try:
+        report = queue_report(game_id, ng)
+        plies = len(ng.moves)
+    finally:
+        GAME_CACHE.put(game_id, version, ng, info)
+    complete = len(report["plies"]) == plies and all(
+        entry["status"] == "done" for entry in report["plies"]
+    )
+    return JsonResponse({"report": report, "complete": complete, "version": version})
+
+
+def move_analysis(request, game_id, ply):
+    analysis = get_object_or_404(MoveAnalysis, game_id=game_id, ply=ply)
+    return JsonResponse(
+        {
+            "ply": analysis.ply,
+            "status": analysis.status,
+            "is_blunder": analysis.is_blunder,
+            "blunder_message": analysis.message,
+        }
+    )
+
+
+def export_games(request, game_id=None):
+    if game_id is not None:
+        get_object_or_404(Game, pk=game_id)
+        games = filter_games(ids=[game_id])
+        filename = f"game-{game_id}.pgn"
     else:
-        return render(
-            request,
-            "chess_game.html",
-            {
-                "chess_id": game_id,
-                "game": {
-                    "info": game.info,
-                    "moves": ng.moves,
-                    "board": ng.str_board(),
-                    "to_move": ng.to_move,
-                    "info": ng.moves[-1] if len(ng.moves) >= 1 else "",
-                },
-            },
-        )
+        ids = [int(x) for x in request.GET.get("ids", "").split(",") if x.isdigit()]
+        try:
+            since = parse_day(request.GET.get("since"))
+            until = parse_day(request.GET.get("until"))
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        games = filter_games(ids=ids, since=since, until=until)
+        filename = "games.pgn"
+    response = StreamingHttpResponse(
+        iter_pgn(games, fens=request.GET.get("fen") == "1"),
+        content_type="application/x-chess-pgn",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def timing_stats(request):
+    if not settings.DEBUG:
+        raise Http404()
+    return JsonResponse(PHASE_HISTOGRAM.snapshot())
+
+
+def metrics(request):
+    return HttpResponse(
+        METRICS.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 def chess_news(request):